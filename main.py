@@ -1,15 +1,45 @@
+import argparse
 import asyncio
+import multiprocessing
+import time
+from pathlib import Path
 from src import settings
 from src.novel.scraper import NovelScraper
 from src.manga.manga_scraper import MangaScraper
-from src.manga.manga_builder import build_manga_epub
-from src.novel.epub_builder import build_epub
-from src.mailer import send_to_kindle
+from src.manga.manga_builder import build_manga_epub, build_manga_epub_stream
+from src.novel.epub_builder import build_epub, build_epub_stream
+from src.mailer import deliver
+from src.cache_manager import CacheManager
+from src.daemon import WatchDaemon
+from src.pipeline import prefetch
+from src import profiling
+from src.sharding import ShardCoordinator, run_shard_worker, wait_for_shards
 
 
-async def main():
-    print(f"--- INICIANDO --- MODO: {'MANGÁ' if settings.IS_MANGA else 'NOVEL TEXTO'}")
+def _scraper_cls():
+    return MangaScraper if settings.IS_MANGA else NovelScraper
+
+
+def _build(novel) -> Path:
+    # Escolhe o construtor correto
+    with profiling.stage("epub_assembly"):
+        if settings.IS_MANGA:
+            return build_manga_epub(novel, settings.OUTPUT_BASE_DIR)
+        return build_epub(novel, settings.OUTPUT_BASE_DIR)
+
 
+def _shard_coordinator() -> ShardCoordinator:
+    return ShardCoordinator(settings.OUTPUT_BASE_DIR / settings.NOVEL_TITLE.strip())
+
+
+async def _record_urls(chapters, urls: list[str]):
+    """Repassa os capítulos ao builder anotando as URLs dos que entram no livro."""
+    async for chapter in chapters:
+        urls.append(chapter.url)
+        yield chapter
+
+
+async def scrape_and_build() -> tuple[Path | None, list[str]]:
     novel = None
 
     if settings.IS_MANGA:
@@ -23,30 +53,143 @@ async def main():
             novel = await scraper.run(start=1, end=None)
 
     if not novel or not novel.chapters:
-        print("[Main] Conteúdo vazio. Encerrando.")
-        return
+        return None, []
 
-    # Escolhe o construtor correto
-    if settings.IS_MANGA:
-        epub_path = build_manga_epub(novel, settings.OUTPUT_BASE_DIR)
+    return _build(novel), [c.url for c in novel.chapters]
+
+
+async def scrape_and_build_stream() -> tuple[Path | None, list[str]]:
+    """Modo streaming: cada capítulo vai para o EPUB assim que é baixado."""
+    builder = build_manga_epub_stream if settings.IS_MANGA else build_epub_stream
+
+    async with _scraper_cls()() as scraper:
+        # A capa baixa enquanto o índice é descoberto
+        scraper.start_cover()
+        await scraper.discover_chapters()
+        novel = await scraper.create_novel()
+        chapters = prefetch(scraper.iter_chapters(start=1, end=None), settings.STREAM_DEPTH)
+        urls: list[str] = []
+        epub_path = await builder(novel, _record_urls(chapters, urls), settings.OUTPUT_BASE_DIR)
+        return epub_path, urls
+
+
+async def run_worker():
+    """Worker de shards: baixa unidades de capítulos para o cache compartilhado."""
+    async with _scraper_cls()() as scraper:
+        await run_shard_worker(scraper, _shard_coordinator())
+
+
+def _worker_process():
+    asyncio.run(run_worker())
+
+
+async def coordinate_and_build() -> tuple[Path | None, list[str]]:
+    """Espera todos os shards terminarem e monta o EPUB a partir do cache."""
+    coordinator = _shard_coordinator()
+    plan = await wait_for_shards(coordinator)
+
+    async with _scraper_cls()() as scraper:
+        novel = await scraper.create_novel()
+        for i, chap in enumerate(plan["chapters"], start=1):
+            if chapter := scraper.load_cached_chapter(chap["url"], i):
+                novel.chapters.append(chapter)
+
+    if not novel.chapters:
+        return None, []
+
+    # Lacunas: capítulos que falharam em todas as tentativas dos workers
+    if failed := coordinator.failed_urls(plan):
+        print(f"[Coordenador] ATENÇÃO: {len(failed)} capítulos ficaram de fora do livro:")
+        for url in failed:
+            print(f"    - {url}")
+
+    epub_path = _build(novel)
+    coordinator.clear()
+    return epub_path, [c.url for c in novel.chapters]
+
+
+async def main(args):
+    print(f"--- INICIANDO --- MODO: {'MANGÁ' if settings.IS_MANGA else 'NOVEL TEXTO'}")
+
+    if args.profile:
+        run_id = time.strftime("%Y%m%d-%H%M%S")
+        profiler = profiling.enable(settings.OUTPUT_BASE_DIR / "profile" / run_id)
+        try:
+            await run(args)
+        finally:
+            profiler.report()
     else:
-        epub_path = build_epub(novel, settings.OUTPUT_BASE_DIR)
+        await run(args)
 
-    # Verifica tamanho antes de enviar (Send-to-Kindle limita a ~50MB)
-    file_size_mb = epub_path.stat().st_size / (1024 * 1024)
-    print(f"[Arquivo] Tamanho final: {file_size_mb:.2f} MB")
 
-    if file_size_mb > 50:
-        print("[!] ATENÇÃO: Arquivo maior que 50MB. O envio por email vai falhar.")
-        print("[!] Recomendo passar via cabo USB ou usar 'Send to Kindle for Web'.")
+async def run(args):
+    if args.watch:
+        await WatchDaemon().run()
+        return
+
+    if args.coordinate:
+        epub_path, urls = await coordinate_and_build()
+    elif settings.STREAM_BUILD:
+        epub_path, urls = await scrape_and_build_stream()
     else:
-        send_to_kindle(
-            epub_path,
-            settings.KINDLE_EMAIL,
-            settings.GMAIL_ADDRESS,
-            settings.GMAIL_APP_PWD,
-        )
+        epub_path, urls = await scrape_and_build()
+
+    if not epub_path:
+        print("[Main] Conteúdo vazio. Encerrando.")
+        return
+
+    with profiling.stage("email"):
+        delivered = deliver(epub_path)
+
+    # Capítulos entregues são os primeiros a sair do cache quando o disco enche
+    cache = CacheManager()
+    if delivered:
+        # Só os capítulos deste livro (a pasta pode ter outros, fora do intervalo)
+        cache.mark_delivered(settings.NOVEL_TITLE.strip(), urls)
+    cache.enforce()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Baixa novels/mangás e gera EPUB.")
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Modo shard: baixa unidades de capítulos para o cache compartilhado.",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Com --worker: quantos workers locais (cada um com seu navegador).",
+    )
+    parser.add_argument(
+        "--coordinate",
+        action="store_true",
+        help="Espera todos os shards terminarem, monta o EPUB e envia.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Gera cProfile + tracemalloc por estágio em novels_output/profile/.",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Daemon: acompanha as séries de WATCH_SERIES e envia capítulos novos.",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    if args.worker:
+        workers = [
+            multiprocessing.Process(target=_worker_process)
+            for _ in range(max(1, args.processes))
+        ]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+    else:
+        asyncio.run(main(args))
@@ -0,0 +1,266 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+from playwright.async_api import Browser, BrowserContext, Page, async_playwright
+from src.libs.stealth import stealth_async
+from src.session import new_session_context, save_session
+from src import settings
+
+# Páginas entre snapshots dos cookies (usados para recriar o contexto após um crash)
+_STATE_EVERY = 10
+_CHROMIUM_NAMES = ("chrom", "headless_shell")
+
+
+class BrowserCrashError(RuntimeError):
+    """O Chromium caiu BROWSER_MAX_CRASHES vezes seguidas: não adianta insistir."""
+
+
+def _children_map() -> dict[int, list[int]]:
+    children: dict[int, list[int]] = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # O nome do processo vem entre parênteses e pode conter espaços
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry.name))
+    return children
+
+
+def chromium_rss_mb() -> float | None:
+    """
+    Memória residente somada dos processos do Chromium abertos por este processo
+    (lida do /proc). None fora do Linux.
+    """
+    if not Path("/proc/self/stat").exists():
+        return None
+    children = _children_map()
+    total_kb = 0
+    stack = list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            comm = Path(f"/proc/{pid}/comm").read_text().strip().lower()
+            if not comm.startswith(_CHROMIUM_NAMES):
+                continue
+            for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total_kb += int(line.split()[1])
+                    break
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+async def wait_pages_closed(pages: set[Page], action: str):
+    """
+    Espera as páginas abertas por outras tarefas (ex: índice em paralelo) serem
+    fechadas, para não derrubá-las no meio do carregamento. Desiste depois de
+    BROWSER_DRAIN_TIMEOUT (página esquecida aberta não trava o scraper).
+    """
+    if not pages:
+        return
+    print(f"[Navegador] Esperando {len(pages)} páginas terminarem para {action}.")
+    deadline = time.monotonic() + settings.BROWSER_DRAIN_TIMEOUT
+    while pages and time.monotonic() < deadline:
+        await asyncio.sleep(0.2)
+
+
+class BrowserManager:
+    """
+    Dono do processo do Chromium. Relança o navegador quando ele cai ou quando
+    `restart()` é pedido (memória alta, muitas páginas). Cada relançamento
+    incrementa `generation`, e os `ManagedContext` abertos recriam seus contextos.
+    """
+
+    def __init__(self, args: list[str] | None = None):
+        self.args = args or []
+        self.playwright = None
+        self.browser: Browser | None = None
+        self.generation = 0
+        self.pages = 0  # páginas abertas desde o último lançamento
+        self.crashes = 0  # quedas seguidas sem nenhuma página bem-sucedida
+        self.open_pages: set[Page] = set()  # páginas abertas e ainda não fechadas
+
+    async def start(self):
+        self.playwright = await async_playwright().start()
+        await self._launch()
+        return self
+
+    async def _launch(self):
+        self.browser = await self.playwright.chromium.launch(headless=True, args=self.args)
+        self.generation += 1
+        self.pages = 0
+        self.open_pages.clear()
+
+    def is_alive(self) -> bool:
+        return self.browser is not None and self.browser.is_connected()
+
+    async def restart(self, reason: str, drain: bool = True):
+        """Relança o Chromium. Com `drain`, espera as páginas abertas terminarem antes."""
+        if drain and self.is_alive():
+            await wait_pages_closed(self.open_pages, "reiniciar o Chromium")
+        print(f"[Navegador] Reiniciando o Chromium ({reason}).")
+        if self.browser:
+            try:
+                await self.browser.close()
+            except Exception:
+                # Já estava morto
+                pass
+        await self._launch()
+
+    async def ensure_alive(self):
+        if self.is_alive():
+            return
+        self.crashes += 1
+        if self.crashes > settings.BROWSER_MAX_CRASHES:
+            raise BrowserCrashError(f"Chromium caiu {self.crashes} vezes seguidas.")
+        await self.restart("navegador caiu", drain=False)
+
+    async def check_memory(self) -> bool:
+        """Reinicia o navegador se a memória passou do limite. True se reiniciou."""
+        rss = chromium_rss_mb()
+        if rss is None or rss <= settings.BROWSER_MAX_RSS_MB:
+            return False
+        await self.restart(f"memória em {rss:.0f} MB")
+        return True
+
+    async def stop(self):
+        if self.browser:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+        if self.playwright:
+            await self.playwright.stop()
+
+
+class ManagedContext:
+    """
+    Contexto do navegador com ciclo de vida controlado:
+    - recicla o contexto a cada BROWSER_RECYCLE_PAGES páginas;
+    - reinicia o navegador a cada BROWSER_RESTART_PAGES páginas ou acima de
+      BROWSER_MAX_RSS_MB;
+    - se o navegador cair ou travar, relança e recria o contexto com os últimos
+      cookies/localStorage e a mesma configuração (stealth em toda página nova).
+    """
+
+    def __init__(self, manager: BrowserManager, session_url: str, **context_kwargs):
+        self.manager = manager
+        self.session_url = session_url
+        self.context_kwargs = context_kwargs
+        self.context: BrowserContext | None = None
+        self.generation = 0
+        self.pages = 0  # páginas abertas neste contexto
+        self.state: dict | None = None  # último snapshot de cookies/localStorage
+        self.open_pages: set[Page] = set()  # páginas deste contexto ainda abertas
+        # Páginas abertas em paralelo (ex: descoberta do índice) não relançam em dobro
+        self.lock = asyncio.Lock()
+
+    async def open(self):
+        if self.state:
+            self.context = await self.manager.browser.new_context(
+                storage_state=self.state, **self.context_kwargs
+            )
+        else:
+            # Primeira abertura: restaura a sessão salva do domínio
+            self.context = await new_session_context(
+                self.manager.browser, self.session_url, **self.context_kwargs
+            )
+        self.generation = self.manager.generation
+        self.pages = 0
+        self.open_pages.clear()
+        return self
+
+    async def _snapshot(self):
+        try:
+            self.state = await self.context.storage_state()
+        except Exception:
+            # Contexto já morto: fica o snapshot anterior
+            pass
+
+    async def recycle(self, reason: str):
+        await wait_pages_closed(self.open_pages, "reciclar o contexto")
+        print(f"[Navegador] Reciclando o contexto ({reason}).")
+        await self._snapshot()
+        try:
+            await self.context.close()
+        except Exception:
+            pass
+        await self.open()
+
+    async def _check_health(self):
+        if not self.manager.is_alive():
+            await self.manager.ensure_alive()
+        elif self.manager.pages >= settings.BROWSER_RESTART_PAGES:
+            await self._snapshot()
+            await self.manager.restart(f"{self.manager.pages} páginas")
+        elif self.pages and self.pages % _STATE_EVERY == 0:
+            await self._snapshot()
+            restarted = await self.manager.check_memory()
+            if not restarted and self.pages >= settings.BROWSER_RECYCLE_PAGES:
+                await self.recycle(f"{self.pages} páginas")
+
+        if self.generation != self.manager.generation:
+            # O navegador foi relançado (por este ou outro contexto)
+            await self.open()
+
+    async def new_page(self) -> Page:
+        """Página nova com stealth, verificando a saúde do navegador antes."""
+        async with self.lock:
+            await self._check_health()
+            try:
+                page = await asyncio.wait_for(
+                    self.context.new_page(), timeout=settings.BROWSER_HEALTH_TIMEOUT
+                )
+            except Exception as e:
+                # Navegador travado ou morto: conta como queda, relança e tenta uma vez mais
+                self.manager.crashes += 1
+                if self.manager.crashes > settings.BROWSER_MAX_CRASHES:
+                    raise BrowserCrashError(
+                        f"Chromium sem resposta {self.manager.crashes} vezes seguidas."
+                    ) from e
+                await self.manager.restart(
+                    f"sem resposta: {str(e) or type(e).__name__}", drain=False
+                )
+                await self.open()
+                # Relançado e ainda travado: TimeoutError sobe para quem pediu a página
+                page = await asyncio.wait_for(
+                    self.context.new_page(), timeout=settings.BROWSER_HEALTH_TIMEOUT
+                )
+
+        await stealth_async(page)
+        self._track(page)
+        self.pages += 1
+        self.manager.pages += 1
+        self.manager.crashes = 0
+        return page
+
+    def _track(self, page: Page):
+        # Sets são limpos a cada relançamento/contexto novo: páginas antigas só saem
+        self.open_pages.add(page)
+        self.manager.open_pages.add(page)
+
+        def closed(_):
+            self.open_pages.discard(page)
+            self.manager.open_pages.discard(page)
+
+        page.on("close", closed)
+
+    def is_healthy(self) -> bool:
+        return self.manager.is_alive() and self.generation == self.manager.generation
+
+    async def close(self):
+        if not self.context:
+            return
+        try:
+            await save_session(self.context, self.session_url)
+            await self.context.close()
+        except Exception:
+            # Navegador caiu no fim: a sessão fica como no último save
+            pass
@@ -0,0 +1,286 @@
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from src.chapter_index import ChapterIndex
+from src import settings
+
+_MB = 1024 * 1024
+# Refeitos a partir dos capítulos (fatias de webtoon, lotes do modo watch que
+# não foram enviados): os primeiros a sair
+_DERIVED_DIRS = ("slices", "entregas")
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class CacheManager:
+    """
+    Mantém o OUTPUT_BASE_DIR dentro de CACHE_QUOTA_GB.
+    O índice (`.cache_index.json`) guarda, por obra e por capítulo, o tamanho,
+    o último acesso e se o capítulo já foi entregue em um EPUB, além do tamanho
+    dos caches derivados de cada obra (`slices/`, `entregas/`) e das capas (`.covers/`).
+    Acima da cota, apaga em ordem LRU: primeiro os caches derivados, depois os
+    capítulos já entregues, depois os demais. Obras em andamento (scraper aberto
+    ou plano de shards) nunca são tocadas.
+
+    Vários processos podem usar o mesmo índice: cada um grava só o que mudou,
+    por cima da versão mais recente do arquivo.
+    """
+
+    FILE_NAME = ".cache_index.json"
+
+    def __init__(self, base_dir: Path | None = None):
+        self.base_dir = base_dir or settings.OUTPUT_BASE_DIR
+        self.path = self.base_dir / self.FILE_NAME
+        self.titles: dict[str, dict] = self._load()
+        # Alterações ainda não gravadas: (obra, capítulo) -> entrada (None = removido)
+        self.changes: dict[tuple[str, str | None], dict | None] = {}
+        self.added_bytes = 0
+        # Quando o "active" de cada obra foi gravado no disco pela última vez
+        self.heartbeat_saved: dict[str, float] = {}
+
+    # ── ÍNDICE ────────────────────────────────────────────────
+    def _load(self) -> dict[str, dict]:
+        if not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8")).get("titles", {})
+        except (OSError, ValueError) as e:
+            # Tamanhos vêm do disco; só se perdem os últimos acessos
+            print(f"[Cache] {self.FILE_NAME} ilegível ({e}), recriando.")
+            return {}
+
+    def _title(self, title: str) -> dict:
+        return self.titles.setdefault(title, {"active": None, "chapters": {}})
+
+    def _chapter(self, title: str, name: str) -> dict:
+        entry = self._title(title)["chapters"].setdefault(
+            name, {"size": 0, "last_access": time.time(), "delivered": False}
+        )
+        self.changes[(title, name)] = entry
+        return entry
+
+    def save(self):
+        """Aplica as alterações sobre o índice atual do disco e grava."""
+        if not self.changes:
+            return
+        titles = self._load()
+        for (title, name), entry in self.changes.items():
+            current = self.titles.get(title, {})
+            target = titles.setdefault(title, {"active": None, "chapters": {}})
+            if name is None:
+                target["active"] = current.get("active")
+                if "derived" in current:
+                    target["derived"] = current["derived"]
+            elif entry is None:
+                target["chapters"].pop(name, None)
+            else:
+                target["chapters"][name] = entry
+        self.titles = titles
+        self.changes.clear()
+
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        data = {"version": 1, "titles": self.titles}
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+
+    # ── REGISTRO (chamado pelos scrapers) ─────────────────────
+    def begin(self, title: str):
+        """Marca a obra como em andamento (protegida da limpeza)."""
+        self._title(title)["active"] = time.time()
+        self.changes[(title, None)] = None
+        self.save()
+        self.heartbeat_saved[title] = time.time()
+
+    def end(self, title: str):
+        self._title(title)["active"] = None
+        self.changes[(title, None)] = None
+        self.save()
+
+    def _heartbeat(self, title: str):
+        # Obra em andamento continua protegida enquanto houver atividade
+        if not self.titles[title]["active"]:
+            return
+        now = time.time()
+        self.titles[title]["active"] = now
+        self.changes[(title, None)] = None
+        # Outros processos só enxergam o disco: grava bem antes de a proteção vencer
+        if now - self.heartbeat_saved.get(title, 0) >= settings.CACHE_ACTIVE_TTL / 4:
+            self.save()
+            self.heartbeat_saved[title] = now
+
+    def touch(self, title: str, chapter_dir: Path):
+        """Capítulo lido do cache: atualiza o último acesso."""
+        self._chapter(title, chapter_dir.name)["last_access"] = time.time()
+        self._heartbeat(title)
+
+    def record(self, title: str, chapter_dir: Path):
+        """Capítulo novo gravado no cache. Confere a cota a cada CACHE_ENFORCE_EVERY_MB."""
+        entry = self._chapter(title, chapter_dir.name)
+        entry["size"] = _dir_size(chapter_dir)
+        entry["last_access"] = time.time()
+        entry["delivered"] = False
+        self._heartbeat(title)
+
+        self.added_bytes += entry["size"]
+        if self.added_bytes >= settings.CACHE_ENFORCE_EVERY_MB * _MB:
+            self.enforce()
+
+    def mark_delivered(self, title: str, urls: list[str]):
+        """Capítulos (pelas URLs) que entraram em um EPUB entregue."""
+        index = ChapterIndex(self.base_dir / title / "chapters")
+        for name in (index.dir_for(url).name for url in urls):
+            self._chapter(title, name)["delivered"] = True
+        self.save()
+
+    # ── LIMPEZA ───────────────────────────────────────────────
+    def _is_protected(self, title: str) -> bool:
+        # Plano de shards: o coordenador ainda vai ler o cache desta obra
+        if (self.base_dir / title / "shards" / "plan.json").exists():
+            return True
+        active = self.titles.get(title, {}).get("active")
+        # Processo que caiu sem chamar end(): a proteção vence depois de um tempo
+        return bool(active) and time.time() - active < settings.CACHE_ACTIVE_TTL
+
+    def _scan_derived(self) -> list[tuple[str | None, Path, dict]]:
+        """
+        Entradas dos caches derivados (uma por tira fatiada / capa), com o tamanho
+        de cada obra no índice. O último acesso é a data da pasta.
+        """
+        derived = []
+        covers_dir = self.base_dir / settings.COVER_CACHE_DIR.name
+        groups = [(None, covers_dir)] + [
+            (title_dir.name, title_dir / name)
+            for title_dir in self.base_dir.iterdir()
+            if title_dir.is_dir()
+            for name in _DERIVED_DIRS
+        ]
+        sizes: dict[str, int] = {}
+        for title, group_dir in groups:
+            if not group_dir.is_dir():
+                continue
+            for item in group_dir.iterdir():
+                entry = {"size": _dir_size(item), "last_access": item.stat().st_mtime}
+                derived.append((title, item, entry))
+                if title is not None:
+                    sizes[title] = sizes.get(title, 0) + entry["size"]
+
+        for title, size in sizes.items():
+            if self._title(title).get("derived") != size:
+                self.titles[title]["derived"] = size
+                self.changes[(title, None)] = None
+        return derived
+
+    def _scan(self) -> tuple[int, list[tuple[str, Path, dict]]]:
+        """Uso total do diretório e os capítulos em cache (sincroniza o índice com o disco)."""
+        total = _dir_size(self.base_dir)
+        chapters = []
+        for title_dir in self.base_dir.iterdir():
+            chapters_dir = title_dir / "chapters"
+            if not chapters_dir.is_dir():
+                continue
+            title = title_dir.name
+            known = self._title(title)["chapters"]
+            on_disk = set()
+            for chap_dir in chapters_dir.iterdir():
+                if not chap_dir.is_dir():
+                    continue
+                on_disk.add(chap_dir.name)
+                entry = known.get(chap_dir.name)
+                if entry is None:
+                    # Capítulo anterior ao índice: usa a data da pasta como acesso
+                    entry = self._chapter(title, chap_dir.name)
+                    entry["last_access"] = chap_dir.stat().st_mtime
+                size = _dir_size(chap_dir)
+                if entry["size"] != size:
+                    self._chapter(title, chap_dir.name)["size"] = size
+                chapters.append((title, chap_dir, entry))
+            # Apagados à mão
+            for name in set(known) - on_disk:
+                del known[name]
+                self.changes[(title, name)] = None
+        return total, chapters
+
+    def usage(self) -> dict[str, int]:
+        """Bytes em cache por obra (capítulos + caches derivados, segundo o índice)."""
+        return {
+            title: sum(c["size"] for c in t["chapters"].values()) + t.get("derived", 0)
+            for title, t in self.titles.items()
+        }
+
+    def report(self):
+        """Uso do cache por obra, da maior para a menor."""
+        for title, size in sorted(self.usage().items(), key=lambda u: -u[1]):
+            if size:
+                print(f"[Cache]   {title}: {size / _MB:.0f} MB")
+
+    def enforce(self) -> int:
+        """Apaga capítulos até o diretório caber na cota. Retorna os bytes liberados."""
+        self.added_bytes = 0
+        if not settings.CACHE_QUOTA_GB or not self.base_dir.exists():
+            return 0
+
+        quota = settings.CACHE_QUOTA_GB * 1024 * _MB
+        total, chapters = self._scan()
+        derived = self._scan_derived()
+        if total <= quota:
+            self.save()
+            return 0
+
+        # Derivados primeiro (acesso mais antigo primeiro); capítulos de obras em
+        # andamento e fatias que o builder está usando ficam
+        derived = sorted(
+            (d for d in derived if d[0] is None or not self._is_protected(d[0])),
+            key=lambda d: d[2]["last_access"],
+        )
+        candidates = [
+            (title, chap_dir, entry)
+            for title, chap_dir, entry in chapters
+            if not self._is_protected(title)
+        ]
+        # Entregues primeiro; dentro de cada grupo, o acesso mais antigo primeiro
+        candidates.sort(key=lambda c: (not c[2]["delivered"], c[2]["last_access"]))
+
+        freed = 0
+        removed_derived = 0
+        for title, item, entry in derived:
+            if total - freed <= quota:
+                break
+            shutil.rmtree(item, ignore_errors=True)
+            freed += entry["size"]
+            removed_derived += 1
+            if title is not None:
+                self.titles[title]["derived"] -= entry["size"]
+                self.changes[(title, None)] = None
+
+        removed = 0
+        for title, chap_dir, entry in candidates:
+            if total - freed <= quota:
+                break
+            shutil.rmtree(chap_dir, ignore_errors=True)
+            freed += entry["size"]
+            removed += 1
+            del self.titles[title]["chapters"][chap_dir.name]
+            self.changes[(title, chap_dir.name)] = None
+
+        self.save()
+        print(
+            f"[Cache] Cota de {settings.CACHE_QUOTA_GB} GB excedida: "
+            f"{removed_derived} caches derivados e {removed} capítulos removidos "
+            f"({freed / _MB:.0f} MB liberados). Uso por obra:"
+        )
+        self.report()
+        if total - freed > quota:
+            print("[Cache] Ainda acima da cota: o resto pertence a obras em andamento ou não é cache.")
+        return freed
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from src.index_discovery import normalize_url
+from src.models import ChapterRef
+
+_LEGACY_DIR_RE = re.compile(r"^chap_(\d+)$")
+
+
+class ChapterIndex:
+    """
+    Tabela estável URL -> pasta do capítulo no cache (`chapters/index.json`).
+    A pasta é derivada da URL normalizada, não da posição na lista: se o site
+    inserir, remover ou inverter capítulos, o cache continua apontando para o
+    conteúdo certo.
+    """
+
+    FILE_NAME = "index.json"
+
+    def __init__(self, chapters_dir: Path):
+        self.chapters_dir = chapters_dir
+        self.path = chapters_dir / self.FILE_NAME
+        self.entries: dict[str, dict] = self._load()
+
+    def _load(self) -> dict[str, dict]:
+        if not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8")).get("chapters", {})
+        except (OSError, ValueError) as e:
+            # A pasta de cada capítulo é derivada da URL: dá para reconstruir a tabela
+            print(f"[Cache] index.json ilegível ({e}), recriando.")
+            return {}
+
+    def _save(self):
+        self.chapters_dir.mkdir(parents=True, exist_ok=True)
+        # Nome por processo: vários workers de shard registram o índice ao mesmo tempo
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        data = {"version": 1, "chapters": self.entries}
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+        tmp.replace(self.path)
+
+    @staticmethod
+    def dir_name(url: str) -> str:
+        digest = hashlib.sha1(normalize_url(url).encode("utf-8")).hexdigest()
+        return f"ch_{digest[:16]}"
+
+    def dir_for(self, url: str) -> Path:
+        entry = self.entries.get(normalize_url(url))
+        return self.chapters_dir / (entry["dir"] if entry else self.dir_name(url))
+
+    def register(self, refs: list[ChapterRef], legacy_refs: list[ChapterRef] | None = None):
+        """
+        Registra os capítulos do índice atual (e migra o cache antigo, se houver).
+        `legacy_refs` é a lista na ordem em que as pastas `chap_NNN` foram criadas.
+        """
+        self._migrate_legacy(legacy_refs or [])
+        for ref in refs:
+            key = normalize_url(ref.url)
+            entry = self.entries.setdefault(key, {"dir": self.dir_name(ref.url)})
+            entry["url"] = ref.url
+            if ref.number is not None:
+                entry["number"] = ref.number
+        self._save()
+
+    def _migrate_legacy(self, legacy_refs: list[ChapterRef]):
+        """
+        Converte pastas antigas `chap_NNN` (chave por posição) para a chave por URL.
+        Usa o `url.txt` gravado pela novel; sem ele (mangá), usa a posição em
+        `legacy_refs`. Sem essa lista, a pasta fica como está e o capítulo é
+        baixado de novo (melhor que pôr as páginas de outro capítulo no livro).
+        """
+        if not self.chapters_dir.exists():
+            return
+
+        migrated = 0
+        for legacy in sorted(self.chapters_dir.iterdir()):
+            match = _LEGACY_DIR_RE.match(legacy.name)
+            if not match or not legacy.is_dir():
+                continue
+
+            url_path = legacy / "url.txt"
+            url = url_path.read_text(encoding="utf-8").strip() if url_path.exists() else ""
+            position = int(match.group(1))
+            if not url and 1 <= position <= len(legacy_refs):
+                url = legacy_refs[position - 1].url
+            if not url:
+                continue
+
+            target = self.dir_for(url)
+            if target.exists():
+                continue
+            try:
+                legacy.rename(target)
+            except OSError:
+                # Outro worker migrou esta pasta primeiro
+                continue
+            (target / "url.txt").write_text(url, encoding="utf-8")
+            self.entries.setdefault(normalize_url(url), {"dir": target.name, "url": url})
+            migrated += 1
+
+        if migrated:
+            print(f"[Cache] {migrated} capítulos migrados para chave por URL.")
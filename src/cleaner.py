@@ -1,4 +1,5 @@
-from bs4 import Tag
+import re
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
 
 AD_KEYWORDS = [
     "leia mais em",
@@ -61,3 +62,125 @@ def clean_html_content(content_el: Tag) -> str:
             tag.decompose()
 
     return str(content_el)
+
+
+# ── NORMALIZAÇÃO / MINIFICAÇÃO ────────────────────────────────
+_KEEP_TAGS = {"p", "em", "strong", "br", "img", "h1", "h2", "h3", "h4", "h5", "h6"}
+_RENAME_TAGS = {"b": "strong", "i": "em"}
+_BLOCK_TAGS = {
+    "div", "section", "article", "main", "blockquote", "center", "figure",
+    "figcaption", "header", "footer", "ul", "ol", "li", "table", "tbody",
+    "thead", "tr", "td", "th", "pre",
+}
+_BLOCK_LIKE = list(_BLOCK_TAGS | {"p", "h1", "h2", "h3", "h4", "h5", "h6"})
+_TEXT_BLOCKS = ["p", "h1", "h2", "h3", "h4", "h5", "h6"]
+_INLINE_TAGS = {"em", "strong", "br", "img"}
+_WHITESPACE_RE = re.compile(r"[\s\xa0]+")
+
+
+def _simplify_tag(tag: Tag):
+    tag.name = _RENAME_TAGS.get(tag.name, tag.name)
+    if tag.name in _KEEP_TAGS:
+        if tag.name == "img":
+            # Imagens com lazy-load guardam a URL real em data-src
+            src = tag.get("src") or tag.get("data-src")
+            alt = tag.get("alt", "")
+            tag.attrs = {"src": src, "alt": alt} if src else {}
+            if not src:
+                tag.decompose()
+        else:
+            tag.attrs = {}
+    elif tag.name in _BLOCK_TAGS:
+        # Div "embrulho" de outros blocos some; div só com texto vira parágrafo
+        if tag.find(_BLOCK_LIKE):
+            tag.unwrap()
+        else:
+            tag.name = "p"
+            tag.attrs = {}
+    else:
+        # span, a, font, u... ficam só com o texto
+        tag.unwrap()
+
+
+def _needs_break(nodes) -> bool:
+    """Há conteúdo do lado (ignora espaços soltos) e ele ainda não é um <br>."""
+    for node in nodes:
+        if isinstance(node, Tag):
+            return node.name != "br"
+        if node.strip():
+            return True
+    return False
+
+
+def _wrap_loose_inline(soup: BeautifulSoup, root: Tag):
+    """Agrupa texto e tags inline soltos na raiz em parágrafos."""
+    run: list = []
+
+    def flush():
+        if any(
+            (isinstance(n, Tag) and n.name == "img") or n.get_text().strip()
+            for n in run
+        ):
+            p = soup.new_tag("p")
+            run[0].insert_before(p)
+            for node in run:
+                p.append(node.extract())
+        else:
+            for node in run:
+                node.extract()
+        run.clear()
+
+    for node in list(root.children):
+        if isinstance(node, Tag) and node.name not in _INLINE_TAGS:
+            if run:
+                flush()
+        else:
+            run.append(node)
+    if run:
+        flush()
+
+
+def minify_html_content(html: str) -> str:
+    """
+    Reduz o HTML do capítulo a um subconjunto semântico mínimo
+    (p, em, strong, br, img, h1-h6), sem class/id/style/data-* e sem
+    espaços ou &nbsp; sobrando. Deixa o EPUB e o cache menores.
+    """
+    soup = BeautifulSoup(f"<div>{html}</div>", "html.parser")
+    root = soup.div
+
+    for comment in root.find_all(string=lambda s: isinstance(s, Comment)):
+        comment.extract()
+
+    # De trás para frente: filhos são tratados antes dos pais
+    for tag in reversed(root.find_all(True)):
+        _simplify_tag(tag)
+
+    # Parágrafo dentro de parágrafo (div só com texto dentro de <p>): vira
+    # uma quebra de linha, senão o texto encosta no de fora
+    for p in root.find_all("p"):
+        if p.find_parent("p"):
+            if _needs_break(p.previous_siblings):
+                p.insert_before(soup.new_tag("br"))
+            if _needs_break(p.next_siblings):
+                p.insert_after(soup.new_tag("br"))
+            p.unwrap()
+
+    for text in root.find_all(string=True):
+        collapsed = _WHITESPACE_RE.sub(" ", text)
+        if collapsed != text:
+            text.replace_with(collapsed)
+
+    _wrap_loose_inline(soup, root)
+
+    for block in root.find_all(_TEXT_BLOCKS):
+        if not block.find("img") and not block.get_text(strip=True):
+            block.decompose()
+            continue
+        # Remove espaço no início/fim do bloco
+        if block.contents and isinstance(block.contents[0], NavigableString):
+            block.contents[0].replace_with(block.contents[0].lstrip())
+        if block.contents and isinstance(block.contents[-1], NavigableString):
+            block.contents[-1].replace_with(block.contents[-1].rstrip())
+
+    return "".join(str(node) for node in root.contents)
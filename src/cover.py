@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import json
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urljoin
+import httpx
+from bs4 import BeautifulSoup
+from PIL import Image
+from src import settings
+
+# Formatos que os leitores (Kindle incluso) aceitam como estão
+_MEDIA_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png"}
+_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png"}
+
+
+@dataclass
+class Cover:
+    data: bytes  # variante no tamanho da tela (a que vai no EPUB)
+    media_type: str
+    thumbnail: Path  # miniatura JPEG no cache
+
+
+def cover_file_name(media_type: str) -> str:
+    """Nome da capa dentro do EPUB, com a extensão do formato real."""
+    return "cover" + _EXTENSIONS.get(media_type, ".jpg")
+
+
+def _cache_dir(source: str) -> Path:
+    return settings.COVER_CACHE_DIR / hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+
+def _load_cached(source: str) -> Cover | None:
+    out_dir = _cache_dir(source)
+    meta_path = out_dir / "meta.json"
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    return Cover(
+        data=(out_dir / meta["file"]).read_bytes(),
+        media_type=meta["media_type"],
+        thumbnail=out_dir / "thumb.jpg",
+    )
+
+
+def _has_alpha(img: Image.Image) -> bool:
+    return img.mode in ("RGBA", "LA") or "transparency" in img.info
+
+
+def _encode(img: Image.Image, keep_alpha: bool) -> tuple[bytes, str]:
+    buf = BytesIO()
+    if keep_alpha:
+        img.save(buf, "PNG", optimize=True)
+        return buf.getvalue(), "image/png"
+    if _has_alpha(img):
+        # Fundo branco no lugar da transparência (JPEG não tem canal alfa)
+        rgba = img.convert("RGBA")
+        img = Image.new("RGB", rgba.size, "white")
+        img.paste(rgba, mask=rgba.getchannel("A"))
+    elif img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    img.save(buf, "JPEG", quality=settings.COVER_JPEG_QUALITY, optimize=True)
+    return buf.getvalue(), "image/jpeg"
+
+
+def process_cover(data: bytes, source: str) -> Cover | None:
+    """
+    Detecta o formato real da imagem e gera a variante no tamanho da tela e a
+    miniatura, guardando as duas no cache pela origem (URL ou arquivo).
+    JPEG/PNG que já cabem na tela passam sem recompressão.
+    """
+    if cached := _load_cached(source):
+        return cached
+
+    try:
+        with Image.open(BytesIO(data)) as img:
+            img.load()
+            media_type = _MEDIA_TYPES.get(img.format)
+            max_w, max_h = settings.COVER_DEVICE_SIZE
+            if media_type and img.width <= max_w and img.height <= max_h:
+                variant = data
+            else:
+                # WebP/GIF/AVIF... ou grande demais: redimensiona e converte
+                device = img.copy()
+                device.thumbnail((max_w, max_h), Image.LANCZOS)
+                variant, media_type = _encode(device, _has_alpha(img))
+
+            thumb = img.copy()
+            thumb.thumbnail(settings.COVER_THUMB_SIZE, Image.LANCZOS)
+            thumb_bytes, _ = _encode(thumb, keep_alpha=False)
+    except Exception as e:
+        print(f"[Capa] Imagem inválida ({e}).")
+        return None
+
+    out_dir = _cache_dir(source)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    file_name = cover_file_name(media_type)
+    (out_dir / file_name).write_bytes(variant)
+    (out_dir / "thumb.jpg").write_bytes(thumb_bytes)
+    # meta.json por último: marca a entrada do cache como completa
+    meta = {"source": source, "file": file_name, "media_type": media_type}
+    (out_dir / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    print(f"[Capa] {img.format} {img.width}x{img.height} -> {media_type}.")
+    return Cover(data=variant, media_type=media_type, thumbnail=out_dir / "thumb.jpg")
+
+
+def find_cover_url(html: str, page_url: str) -> str | None:
+    """Primeira imagem que casa com COVER_SELECTORS (aceita <meta og:image>)."""
+    soup = BeautifulSoup(html, "html.parser")
+    for sel in settings.COVER_SELECTORS:
+        if tag := soup.select_one(sel):
+            # data-src antes de src: em lazy loading o src é só um placeholder
+            url = tag.get("content") or tag.get("data-src") or tag.get("src")
+            if url and not url.startswith("data:"):
+                return urljoin(page_url, url.strip())
+    return None
+
+
+def _local_cover_path(title: str) -> Path | None:
+    # COVER_FILE_PATH é da obra configurada em settings (não de outras séries)
+    candidates = [settings.OUTPUT_BASE_DIR / title.strip() / "cover.jpg"]
+    if title == settings.NOVEL_TITLE:
+        candidates.insert(0, Path(settings.COVER_FILE_PATH))
+    return next((p for p in candidates if p.exists()), None)
+
+
+async def fetch_cover(
+    client: httpx.AsyncClient,
+    title: str,
+    index_url: str,
+    fetch_html: Callable[[str], Awaitable[str | None]] | None = None,
+) -> Cover | None:
+    """
+    Capa da obra, pelo cliente HTTP do scraper (roda junto com a descoberta do
+    índice). Se o site barrar o httpx, `fetch_html` (navegador) lê a página.
+    """
+    if settings.COVER_MODE == "local":
+        path = _local_cover_path(title)
+        if not path:
+            return None
+        # A data de modificação entra na chave: trocar o arquivo refaz as variantes
+        source = f"{path.resolve()}:{path.stat().st_mtime_ns}"
+        return await asyncio.to_thread(process_cover, path.read_bytes(), source)
+
+    print("[Capa] Buscando capa no site...")
+    html = None
+    try:
+        resp = await client.get(index_url)
+        if resp.status_code == 200:
+            html = resp.text
+    except httpx.HTTPError as e:
+        print(f"[Capa] Erro ao ler o índice ({e}).")
+    if html is None and fetch_html:
+        html = await fetch_html(index_url)
+
+    img_url = find_cover_url(html, index_url) if html else None
+    if not img_url:
+        print("[Capa] Nenhuma capa encontrada.")
+        return None
+    if cached := _load_cached(img_url):
+        print("[Capa] Usando capa em cache do disco.")
+        return cached
+
+    try:
+        resp = await client.get(img_url, headers={"Referer": index_url})
+        resp.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"[Capa] Erro ao baixar {img_url} ({e}).")
+        return None
+    return await asyncio.to_thread(process_cover, resp.content, img_url)
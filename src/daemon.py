@@ -0,0 +1,276 @@
+import asyncio
+import json
+import random
+import shutil
+import time
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from pathlib import Path
+from src.browser import BrowserCrashError, BrowserManager
+from src.cache_manager import CacheManager
+from src.index_discovery import normalize_url
+from src.mailer import MAX_EMAIL_SIZE_MB, deliver
+from src.manga.manga_builder import build_manga_epub, sanitize_filename
+from src.manga.manga_scraper import MangaScraper
+from src.models import Chapter, Novel
+from src.novel.epub_builder import build_epub
+from src.novel.scraper import BROWSER_ARGS, NovelScraper
+from src import settings
+
+
+@dataclass
+class WatchedSeries:
+    title: str
+    url: str
+    is_manga: bool = False
+    author: str = "Desconhecido"
+    interval: float = settings.WATCH_DEFAULT_INTERVAL
+    # ── Estado (persistido em watch_state.json) ──
+    known: set[str] = field(default_factory=set)  # URLs já entregues (ou da linha de base)
+    last_check: float | None = None
+    next_check: float = 0.0
+    current_interval: float = 0.0
+    update_rate: float = 0.0  # média móvel de capítulos novos por checagem
+    failed_sends: int = 0  # checagens seguidas com capítulos que não foram enviados
+
+
+def _iso(ts: float | None) -> str | None:
+    return datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else None
+
+
+class WatchDaemon:
+    """
+    Acompanha várias séries com um único navegador aberto.
+    Cada série tem seu intervalo, que encurta quando aparecem capítulos novos e
+    alonga quando não aparecem (com jitter, para não bater no site em horário fixo).
+    Capítulos novos são baixados, empacotados em um EPUB e enviados ao Kindle.
+    O estado fica em watch_status.json: fila, última e próxima checagem por série.
+    """
+
+    def __init__(self, series: list[dict] | None = None):
+        self.state_path = settings.OUTPUT_BASE_DIR / "watch_state.json"
+        self.status_path = settings.OUTPUT_BASE_DIR / "watch_status.json"
+        self.series = [WatchedSeries(**cfg) for cfg in (series or settings.WATCH_SERIES)]
+        self.browser = BrowserManager(BROWSER_ARGS)
+        self._load_state()
+
+    # ── ESTADO ────────────────────────────────────────────────
+    def _load_state(self):
+        if not self.state_path.exists():
+            return
+        state = json.loads(self.state_path.read_text(encoding="utf-8"))
+        for s in self.series:
+            saved = state.get(s.url)
+            if not saved:
+                continue
+            s.known = set(saved.get("known", []))
+            s.last_check = saved.get("last_check")
+            s.next_check = saved.get("next_check", 0.0)
+            s.current_interval = saved.get("current_interval", 0.0)
+            s.update_rate = saved.get("update_rate", 0.0)
+            s.failed_sends = saved.get("failed_sends", 0)
+
+    def _save_state(self):
+        state = {
+            s.url: {
+                "known": sorted(s.known),
+                "last_check": s.last_check,
+                "next_check": s.next_check,
+                "current_interval": s.current_interval,
+                "update_rate": s.update_rate,
+                "failed_sends": s.failed_sends,
+            }
+            for s in self.series
+        }
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.state_path)
+
+    def queue_depth(self) -> int:
+        """Séries com checagem vencida esperando a vez."""
+        now = time.time()
+        return sum(1 for s in self.series if s.next_check <= now)
+
+    def _write_status(self):
+        status = {
+            "updated_at": _iso(time.time()),
+            "queue_depth": self.queue_depth(),
+            "series": [
+                {
+                    "title": s.title,
+                    "last_check": _iso(s.last_check),
+                    "next_check": _iso(s.next_check),
+                    "interval_s": round(s.current_interval or s.interval),
+                    "update_rate": round(s.update_rate, 2),
+                    "known_chapters": len(s.known),
+                }
+                for s in self.series
+            ],
+        }
+        self.status_path.parent.mkdir(parents=True, exist_ok=True)
+        self.status_path.write_text(
+            json.dumps(status, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+    # ── AGENDA ────────────────────────────────────────────────
+    def _next_series(self) -> WatchedSeries:
+        now = time.time()
+        due = [s for s in self.series if s.next_check <= now]
+        if due:
+            # Entre as vencidas, primeiro as que mais atualizam
+            return max(due, key=lambda s: (s.update_rate, -s.next_check))
+        return min(self.series, key=lambda s: s.next_check)
+
+    def _reschedule(self, s: WatchedSeries, found: int):
+        current = s.current_interval or s.interval
+        if found:
+            current = max(settings.WATCH_MIN_INTERVAL, current / 2)
+        else:
+            current = min(settings.WATCH_MAX_INTERVAL, current * 1.5)
+        s.current_interval = current
+        s.update_rate = 0.7 * s.update_rate + 0.3 * found
+        jitter = random.uniform(-settings.WATCH_JITTER, settings.WATCH_JITTER) * current
+        s.last_check = time.time()
+        s.next_check = s.last_check + current + jitter
+
+    # ── CHECAGEM ──────────────────────────────────────────────
+    def _build(self, s: WatchedSeries, novel: Novel, chapters: list[Chapter]) -> Path:
+        first, last = chapters[0].index, chapters[-1].index
+        title = f"{s.title} - Caps {first}-{last}" if first != last else f"{s.title} - Cap {first}"
+        batch = replace(novel, title=title, chapters=chapters)
+        out_dir = settings.OUTPUT_BASE_DIR / s.title.strip() / "entregas"
+        if s.is_manga:
+            # Fatias no cache da obra (o mesmo do modo normal), não um por lote
+            slices_dir = settings.OUTPUT_BASE_DIR / sanitize_filename(s.title) / "slices"
+            return build_manga_epub(batch, out_dir, slices_dir)
+        return build_epub(batch, out_dir)
+
+    def _build_batches(self, s: WatchedSeries, novel: Novel) -> list[tuple[list[Chapter], Path]]:
+        """Monta os EPUBs; lote acima do limite do e-mail é dividido ao meio até caber."""
+        pending = [novel.chapters]
+        batches = []
+        while pending:
+            chapters = pending.pop(0)
+            epub_path = self._build(s, novel, chapters)
+            size_mb = epub_path.stat().st_size / (1024 * 1024)
+            if size_mb > MAX_EMAIL_SIZE_MB and len(chapters) > 1:
+                print(f"[Watch] {s.title}: EPUB com {size_mb:.0f} MB, dividindo o lote.")
+                shutil.rmtree(epub_path.parent, ignore_errors=True)
+                half = len(chapters) // 2
+                pending[:0] = [chapters[:half], chapters[half:]]
+                continue
+            batches.append((chapters, epub_path))
+        return batches
+
+    async def check(self, s: WatchedSeries) -> int:
+        """
+        Procura capítulos novos da série e entrega os que conseguir baixar.
+        Retorna quantos capítulos novos apareceram no site (mesmo que o envio
+        falhe): é o que o agendador usa para ajustar o intervalo.
+        """
+        scraper_cls = MangaScraper if s.is_manga else NovelScraper
+        async with scraper_cls(s.title, s.author, s.url, browser=self.browser) as scraper:
+            refs = await scraper.discover_chapters()
+            if not refs:
+                return 0
+
+            if not s.known:
+                # Primeira checagem: o que já existe vira linha de base (não reenvia a obra)
+                s.known = {normalize_url(r.url) for r in refs}
+                print(f"[Watch] {s.title}: linha de base com {len(refs)} capítulos.")
+                return 0
+
+            new = [
+                (i, r)
+                for i, r in enumerate(refs, start=1)
+                if normalize_url(r.url) not in s.known
+            ]
+            if not new:
+                print(f"[Watch] {s.title}: nada novo.")
+                return 0
+
+            print(f"[Watch] {s.title}: {len(new)} capítulos novos.")
+            novel = await scraper.create_novel()
+            for i, ref in new:
+                if chapter := await scraper.fetch_chapter(ref.url, i):
+                    novel.chapters.append(chapter)
+                await asyncio.sleep(
+                    random.uniform(settings.REQUEST_DELAY_MIN, settings.REQUEST_DELAY_MAX)
+                )
+
+        if not novel.chapters:
+            return len(new)
+
+        # Montar e enviar é bloqueante: roda em thread para não travar o agendador
+        batches = await asyncio.to_thread(self._build_batches, s, novel)
+        delivered: list[Chapter] = []
+        for chapters, epub_path in batches:
+            if await asyncio.to_thread(deliver, epub_path):
+                delivered.extend(chapters)
+                # Já está no Kindle: o EPUB do lote não serve para mais nada
+                shutil.rmtree(epub_path.parent, ignore_errors=True)
+
+        sent = {id(c) for c in delivered}
+        failed = [c for c in novel.chapters if id(c) not in sent]
+        if not failed:
+            s.failed_sends = 0
+        else:
+            s.failed_sends += 1
+            if s.failed_sends >= settings.WATCH_MAX_SEND_ATTEMPTS:
+                # Sem isso o mesmo lote seria remontado e reenviado a cada checagem
+                print(
+                    f"[Watch] AVISO: {s.title}: {len(failed)} capítulos falharam no envio "
+                    f"{s.failed_sends} vezes seguidas. Marcando como conhecidos; "
+                    f"os EPUBs ficam em {settings.OUTPUT_BASE_DIR / s.title.strip() / 'entregas'} "
+                    f"(até a cota de disco precisar do espaço)."
+                )
+                s.known.update(normalize_url(c.url) for c in failed)
+                s.failed_sends = 0
+            else:
+                # Não marca como entregue: tenta de novo na próxima checagem
+                print(
+                    f"[Watch] {s.title}: envio falhou para {len(failed)} capítulos "
+                    f"(tentativa {s.failed_sends}/{settings.WATCH_MAX_SEND_ATTEMPTS})."
+                )
+
+        if delivered:
+            s.known.update(normalize_url(c.url) for c in delivered)
+            cache = CacheManager()
+            cache.mark_delivered(s.title.strip(), [c.url for c in delivered])
+            cache.enforce()
+        return len(new)
+
+    # ──────────────────────────────────────────────────────────
+    async def run(self):
+        if not self.series:
+            print("[Watch] WATCH_SERIES está vazio. Nada para acompanhar.")
+            return
+
+        await self.browser.start()
+        print(f"[Watch] Acompanhando {len(self.series)} séries.")
+        try:
+            while True:
+                s = self._next_series()
+                wait = s.next_check - time.time()
+                if wait > 0:
+                    self._write_status()
+                    await asyncio.sleep(min(wait, settings.WATCH_STATUS_INTERVAL))
+                    continue
+
+                print(f"[Watch] Checando {s.title} (fila: {self.queue_depth()})")
+                # Entre uma checagem e outra: relança se caiu ou se a memória subiu
+                await self.browser.ensure_alive()
+                await self.browser.check_memory()
+                try:
+                    found = await self.check(s)
+                except BrowserCrashError:
+                    raise
+                except Exception as e:
+                    print(f"[Watch] Erro ao checar {s.title}: {e}")
+                    found = 0
+                self._reschedule(s, found)
+                self._save_state()
+                self._write_status()
+        finally:
+            await self.browser.stop()
@@ -0,0 +1,61 @@
+from zipfile import ZIP_STORED
+from pathlib import Path
+from ebooklib import epub
+from src.epub_zip import EpubZipFile, EpubZipWriter
+
+
+class StreamingEpubWriter(EpubZipWriter):
+    """
+    Escreve um EPUB aos poucos: cada item vai para o zip assim que é adicionado
+    e seu conteúdo é descartado da memória. OPF, NCX e sumário só precisam dos
+    metadados (nomes, títulos, ordem), então são gravados no `close()`.
+    O arquivo fica como `.part` até fechar, para nunca deixar um EPUB incompleto.
+    """
+
+    def __init__(self, output_path: Path, book: epub.EpubBook):
+        self.output_path = Path(output_path)
+        self.part_path = self.output_path.with_name(self.output_path.name + ".part")
+        # A page-list do sumário exige reler o HTML de todos os capítulos, que já
+        # foram descartados; os capítulos gerados aqui não têm marcadores de página
+        super().__init__(str(self.part_path), book, {"epub3_pages": False})
+        self.out = None
+
+    def open(self):
+        self.out = EpubZipFile(self.file_name)
+        # mimetype precisa ser a primeira entrada e sem compressão
+        self.out.writestr(
+            "mimetype", "application/epub+zip", compress_type=ZIP_STORED
+        )
+        self._write_container()
+
+        # Itens adicionados antes de abrir (capa, CSS...) já podem ser gravados
+        for item in self.book.get_items():
+            self._write_item(item)
+        return self
+
+    def _write_item(self, item):
+        self.out.writestr(f"{self.book.FOLDER_NAME}/{item.file_name}", item.get_content())
+        # O OPF só precisa de nome/tipo do item: libera o conteúdo
+        item.content = b""
+
+    def add_item(self, item):
+        """Adiciona o item ao livro e grava o conteúdo no zip na hora."""
+        self.book.add_item(item)
+        self._write_item(item)
+        return item
+
+    def close(self) -> Path:
+        ncx = self.book.add_item(epub.EpubNcx())
+        nav = self.book.add_item(epub.EpubNav())
+        self._write_opf()
+        self.out.writestr(f"{self.book.FOLDER_NAME}/{ncx.file_name}", self._get_ncx())
+        self.out.writestr(f"{self.book.FOLDER_NAME}/{nav.file_name}", self._get_nav(nav))
+        self.out.close()
+        self.part_path.replace(self.output_path)
+        return self.output_path
+
+    def abort(self):
+        """Descarta o arquivo parcial (ex: nenhum capítulo chegou)."""
+        if self.out:
+            self.out.close()
+        self.part_path.unlink(missing_ok=True)
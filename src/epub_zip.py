@@ -0,0 +1,141 @@
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+from ebooklib import epub
+from src import settings
+
+# Formatos do cabeçalho zip (PKWARE APPNOTE 4.3.7, 4.3.12 e 4.3.16)
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_END_RECORD = struct.Struct("<4s4H2LH")
+_UTF8_FLAG = 0x800
+_ZIP32_LIMIT = 0xFFFFFFFF
+
+
+def _dos_datetime(ts: float) -> tuple[int, int]:
+    t = time.localtime(ts)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def _compress(data: bytes, method: int, level: int) -> tuple[int, int, bytes]:
+    """Roda em uma thread: zlib libera o GIL, então threads usam vários núcleos."""
+    crc = zlib.crc32(data)
+    if method == ZIP_DEFLATED:
+        # Deflate "raw" (wbits negativo), como o formato zip exige
+        comp = zlib.compressobj(level, zlib.DEFLATED, -15)
+        packed = comp.compress(data) + comp.flush()
+        # Se não compensou, guarda sem compressão
+        if len(packed) < len(data):
+            return ZIP_DEFLATED, crc, packed
+    return ZIP_STORED, crc, data
+
+
+class EpubZipFile:
+    """
+    Escritor de zip mínimo para EPUB, com a mesma interface `writestr` que o
+    ebooklib usa no `zipfile.ZipFile`.
+    - Imagens (JPEG/PNG/WebP...) já são comprimidas: vão sem deflate.
+    - XHTML/CSS/OPF são comprimidos em paralelo, no nível configurado.
+    - As entradas são gravadas na ordem em que chegam (`mimetype` primeiro).
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        compresslevel: int | None = None,
+        workers: int | None = None,
+    ):
+        self.fp = open(path, "wb")
+        self.level = settings.EPUB_COMPRESS_LEVEL if compresslevel is None else compresslevel
+        workers = workers or settings.EPUB_COMPRESS_WORKERS or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        # Limita os itens comprimidos esperando gravação (memória constante)
+        self.max_pending = workers * 2
+        self.pending: deque[tuple[str, int, Future]] = deque()
+        self.entries: list[tuple[bytes, int, int, int, int, int]] = []
+        self.dos_time, self.dos_date = _dos_datetime(time.time())
+
+    def _method_for(self, name: str, compress_type: int | None) -> int:
+        if name == "mimetype" or compress_type == ZIP_STORED:
+            return ZIP_STORED
+        if Path(name).suffix.lower() in settings.EPUB_STORED_EXTENSIONS:
+            return ZIP_STORED
+        return ZIP_DEFLATED
+
+    def writestr(self, name: str, data: str | bytes, compress_type: int | None = None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        method = self._method_for(name, compress_type)
+        future = self.pool.submit(_compress, data, method, self.level)
+        self.pending.append((name, len(data), future))
+        while len(self.pending) > self.max_pending:
+            self._flush_one()
+
+    def _flush_one(self):
+        name, size, future = self.pending.popleft()
+        method, crc, packed = future.result()
+        offset = self.fp.tell()
+        if offset + len(packed) > _ZIP32_LIMIT or size > _ZIP32_LIMIT:
+            raise ValueError("EPUB maior que 4 GB não é suportado (sem ZIP64).")
+
+        raw_name = name.encode("utf-8")
+        self.fp.write(
+            _LOCAL_HEADER.pack(
+                b"PK\x03\x04", 20, 0, _UTF8_FLAG, method,
+                self.dos_time, self.dos_date, crc, len(packed), size,
+                len(raw_name), 0,
+            )
+        )
+        self.fp.write(raw_name)
+        self.fp.write(packed)
+        self.entries.append((raw_name, method, crc, len(packed), size, offset))
+
+    def close(self):
+        try:
+            while self.pending:
+                self._flush_one()
+
+            cd_offset = self.fp.tell()
+            for raw_name, method, crc, csize, size, offset in self.entries:
+                self.fp.write(
+                    _CENTRAL_HEADER.pack(
+                        b"PK\x01\x02", 20, 0, 20, 0, _UTF8_FLAG, method,
+                        self.dos_time, self.dos_date, crc, csize, size,
+                        len(raw_name), 0, 0, 0, 0, 0, offset,
+                    )
+                )
+                self.fp.write(raw_name)
+            cd_size = self.fp.tell() - cd_offset
+            count = len(self.entries)
+            self.fp.write(
+                _END_RECORD.pack(b"PK\x05\x06", 0, 0, count, count, cd_size, cd_offset, 0)
+            )
+        finally:
+            self.pool.shutdown()
+            self.fp.close()
+
+
+class EpubZipWriter(epub.EpubWriter):
+    """`EpubWriter` do ebooklib gravando pelo `EpubZipFile`."""
+
+    def write(self):
+        self.out = EpubZipFile(self.file_name)
+        self.out.writestr("mimetype", "application/epub+zip", compress_type=ZIP_STORED)
+        self._write_container()
+        self._write_opf()
+        self._write_items()
+        self.out.close()
+
+
+def write_epub(output_path: Path, book: epub.EpubBook):
+    """Substituto de `epub.write_epub` com a política de compressão por item."""
+    writer = EpubZipWriter(str(output_path), book, {})
+    writer.process()
+    writer.write()
@@ -0,0 +1,385 @@
+import asyncio
+import re
+from collections.abc import Callable
+from urllib.parse import parse_qs, urlencode, urljoin, urlparse, urlunparse
+from bs4 import BeautifulSoup
+from playwright.async_api import Page
+from src.browser import BrowserCrashError, ManagedContext
+from src.models import ChapterRef
+from src import settings
+
+# "capitulo-12", "chapter_12.5", "cap/12", "ep-3", "capitulo-12-5"...
+# O prefixo não pode estar no meio de outra palavra ("search", "step"), e o
+# "-" só vale como decimal com 1-2 dígitos (em "episodio-1-2024", 2024 é o ano)
+_CHAPTER_NUM_RE = re.compile(
+    r"(?<![a-z])(?:cap[ií]tulo|chapter|chap|cap|ch|epis[oó]dio|episode|ep)[-_ /.#]*"
+    r"(\d+(?:[.,]\d+|-\d{1,2}(?!\d))?)",
+    re.IGNORECASE,
+)
+# "?p=N" fica de fora: no WordPress é link curto de post, não página do índice
+_PAGE_NUM_RE = re.compile(r"(/page/|[?&](?:page|pg)=)(\d+)")
+_API_NUMBER_KEYS = ("number", "chapter_number", "chapter", "num", "chap", "order")
+_API_URL_KEYS = ("url", "link", "href", "permalink")
+
+
+def parse_chapter_number(url: str, text: str = "") -> float | None:
+    """Tenta descobrir o número do capítulo pelo texto do link ou pela URL."""
+    for source in (text, urlparse(url).path):
+        if match := _CHAPTER_NUM_RE.search(source or ""):
+            raw = match.group(1).replace(",", ".").replace("-", ".")
+            try:
+                return float(raw)
+            except ValueError:
+                continue
+    return None
+
+
+def normalize_url(url: str) -> str:
+    """Remove fragmento e barra final para deduplicar links do mesmo capítulo."""
+    parts = urlparse(url)
+    path = parts.path.rstrip("/") or "/"
+    return urlunparse((parts.scheme, parts.netloc.lower(), path, "", parts.query, ""))
+
+
+def extract_links(
+    html: str, base_url: str, selector: str, first_match: bool = True
+) -> list[ChapterRef]:
+    """Lê os links de capítulo de um HTML de índice."""
+    soup = BeautifulSoup(html, "html.parser")
+    refs = []
+    for sel in selector.split(","):
+        found = soup.select(sel.strip())
+        if not found:
+            continue
+        for a in found:
+            if href := a.get("href"):
+                url = urljoin(base_url, href.strip())
+                text = a.get_text(" ", strip=True)
+                refs.append(
+                    ChapterRef(url=url, number=parse_chapter_number(url, text), title=text)
+                )
+        if first_match:
+            break
+    return refs
+
+
+def order_chapters(refs: list[ChapterRef], reverse_fallback: bool = False) -> list[ChapterRef]:
+    """
+    Deduplica pela URL normalizada e ordena pelo número do capítulo.
+    Se a maioria não tiver número, mantém a ordem do site (invertida se pedido).
+    """
+    unique: dict[str, ChapterRef] = {}
+    for ref in refs:
+        key = normalize_url(ref.url)
+        if key not in unique:
+            unique[key] = ref
+        elif unique[key].number is None and ref.number is not None:
+            unique[key] = ref
+
+    ordered = list(unique.values())
+    numbered = sum(1 for r in ordered if r.number is not None)
+    if ordered and numbered >= len(ordered) / 2:
+        # Sem número vão para o fim, preservando a ordem relativa (sort estável)
+        return sorted(
+            ordered, key=lambda r: (r.number is None, r.number if r.number is not None else 0)
+        )
+    if reverse_fallback:
+        ordered.reverse()
+    return ordered
+
+
+class IndexDiscovery:
+    """
+    Descobre a lista completa de capítulos de uma obra.
+    Estratégias:
+      - "single": lê apenas a página do índice
+      - "pagination": segue os links de paginação, buscando as páginas em paralelo
+      - "scroll": rola a página (e clica em "carregar mais") até a lista parar de crescer
+      - "api": captura o JSON que o site usa para montar a lista de capítulos
+      - "auto": scroll + paginação (+ API se INDEX_API_URL_PATTERN estiver definido)
+    """
+
+    def __init__(
+        self,
+        session: ManagedContext,
+        selector: str | None = None,
+        strategy: str | None = None,
+        first_match: bool = True,
+        link_filter: Callable[[str], bool] | None = None,
+    ):
+        # Páginas abertas pelo ManagedContext: health check, reciclagem e relançamento
+        self.session = session
+        self.selector = selector or settings.CHAPTER_LINKS_SELECTOR
+        self.strategy = strategy or settings.INDEX_STRATEGY
+        self.first_match = first_match
+        self.link_filter = link_filter
+        self.sem = asyncio.Semaphore(settings.INDEX_CONCURRENCY)
+        # Links da página do índice como ela chega (sem rolar, sem paginação e na
+        # ordem do site): é a lista que os caches antigos `chap_NNN` usavam
+        self.initial_refs: list[ChapterRef] = []
+
+    async def _fetch_html(self, url: str) -> str | None:
+        async with self.sem:
+            page = None
+            try:
+                page = await self.session.new_page()
+                await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+                await page.evaluate("window.scrollTo(0, 500)")
+                await asyncio.sleep(1)
+                return await page.content()
+            except BrowserCrashError:
+                raise
+            except Exception as e:
+                print(f"    [!] Erro ao ler página do índice {url}: {e}")
+                return None
+            finally:
+                if page:
+                    try:
+                        await page.close()
+                    except Exception:
+                        # Página de um navegador que caiu
+                        pass
+
+    def _links(self, html: str, base_url: str) -> list[ChapterRef]:
+        return extract_links(html, base_url, self.selector, self.first_match)
+
+    # ── PAGINAÇÃO ─────────────────────────────────────────────
+    @staticmethod
+    def _same_listing(page_url: str, match: re.Match, index_url: str) -> bool:
+        """O link numerado é uma página deste índice (mesmo esquema, host e caminho)?"""
+        page, index = urlparse(page_url), urlparse(index_url)
+        path = page.path
+        if match.group(1) == "/page/":
+            path = path[: path.find("/page/")]
+        return (page.scheme, page.netloc.lower(), path.rstrip("/")) == (
+            index.scheme,
+            index.netloc.lower(),
+            index.path.rstrip("/"),
+        )
+
+    def _pagination_urls(self, html: str, base_url: str, index_url: str) -> list[str]:
+        soup = BeautifulSoup(html, "html.parser")
+        urls = [
+            urljoin(base_url, a["href"])
+            for a in soup.select(settings.INDEX_PAGINATION_SELECTOR)
+            if a.get("href")
+        ]
+        host = urlparse(index_url).netloc.lower()
+        urls = [
+            u
+            for u in dict.fromkeys(urls)
+            if normalize_url(u) != normalize_url(base_url) and urlparse(u).netloc.lower() == host
+        ]
+
+        # Se os links seguem um padrão numérico (/page/N, ?page=N), gera todas as
+        # páginas até a última de uma vez, sem precisar visitar uma por uma
+        pages = [
+            (m, u)
+            for u in urls
+            if (m := _PAGE_NUM_RE.search(u)) and self._same_listing(u, m, index_url)
+        ]
+        if pages:
+            last_match, last_url = max(pages, key=lambda p: int(p[0].group(2)))
+            last = int(last_match.group(2))
+            if last > settings.INDEX_MAX_PAGES:
+                print(f"[Índice] Paginação vai até {last}; limitando a {settings.INDEX_MAX_PAGES}.")
+                last = settings.INDEX_MAX_PAGES
+            prefix = last_url[: last_match.start(2)]
+            suffix = last_url[last_match.end(2) :]
+            urls.extend(f"{prefix}{n}{suffix}" for n in range(2, last + 1))
+        return list(dict.fromkeys(urls))
+
+    async def _discover_pagination(self, index_url: str, first_html: str) -> list[ChapterRef]:
+        refs = self._links(first_html, index_url)
+        seen = {normalize_url(index_url)}
+        pending = self._pagination_urls(first_html, index_url, index_url)
+
+        # Busca em ondas: cada onda pode revelar novos links de paginação
+        while pending and len(seen) <= settings.INDEX_MAX_PAGES:
+            batch = [u for u in dict.fromkeys(pending) if normalize_url(u) not in seen]
+            batch = batch[: settings.INDEX_MAX_PAGES + 1 - len(seen)]
+            seen.update(normalize_url(u) for u in batch)
+            if not batch:
+                break
+            print(f"[Índice] Buscando {len(batch)} páginas do índice em paralelo...")
+            htmls = await asyncio.gather(*(self._fetch_html(u) for u in batch))
+            pending = []
+            for url, html in zip(batch, htmls):
+                if not html:
+                    continue
+                refs.extend(self._links(html, url))
+                pending.extend(self._pagination_urls(html, url, index_url))
+        return refs
+
+    # ── SCROLL / CARREGAR MAIS ────────────────────────────────
+    async def _discover_scroll(self, page: Page, index_url: str) -> list[ChapterRef]:
+        last_count = -1
+        stable_rounds = 0
+        refs: list[ChapterRef] = []
+        for _ in range(settings.INDEX_SCROLL_MAX_ROUNDS):
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            if settings.INDEX_LOAD_MORE_SELECTOR:
+                try:
+                    button = await page.query_selector(settings.INDEX_LOAD_MORE_SELECTOR)
+                    if button and await button.is_visible():
+                        await button.click()
+                except Exception:
+                    pass
+            await asyncio.sleep(settings.INDEX_SCROLL_PAUSE)
+
+            refs = self._links(await page.content(), index_url)
+            if len(refs) == last_count:
+                stable_rounds += 1
+                # Duas rodadas sem crescer: lista completa
+                if stable_rounds >= 2:
+                    break
+            else:
+                stable_rounds = 0
+                last_count = len(refs)
+        return refs
+
+    # ── API JSON ──────────────────────────────────────────────
+    def _refs_from_json(self, data, base_url: str) -> list[ChapterRef]:
+        refs = []
+        if isinstance(data, list):
+            for item in data:
+                refs.extend(self._refs_from_json(item, base_url))
+        elif isinstance(data, dict):
+            url = next((data[k] for k in _API_URL_KEYS if isinstance(data.get(k), str)), None)
+            if url:
+                url = urljoin(base_url, url)
+                number = None
+                for k in _API_NUMBER_KEYS:
+                    try:
+                        number = float(data[k])
+                        break
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                if number is None:
+                    number = parse_chapter_number(url, str(data.get("title", "")))
+                refs.append(ChapterRef(url=url, number=number, title=str(data.get("title", ""))))
+            else:
+                for value in data.values():
+                    refs.extend(self._refs_from_json(value, base_url))
+        return refs
+
+    async def _discover_api(self, captured: list[tuple[str, object]], index_url: str) -> list[ChapterRef]:
+        refs = []
+        for _, data in captured:
+            refs.extend(self._refs_from_json(data, index_url))
+        if not captured:
+            return refs
+
+        # API paginada (?page=N): continua pelas próximas páginas em lotes paralelos
+        api_url, _ = captured[-1]
+        parts = urlparse(api_url)
+        query = parse_qs(parts.query)
+        pages = [int(p) for p in query.get("page", []) if p.isdigit()]
+        if not pages:
+            return refs
+
+        seen = {normalize_url(r.url) for r in refs}
+        next_page = max(pages) + 1
+        # APIs que ignoram ou limitam um `page` fora do intervalo repetem a última
+        # página: para quando um lote não traz nenhum capítulo novo
+        while next_page <= settings.INDEX_MAX_PAGES:
+            batch = range(next_page, min(next_page + settings.INDEX_CONCURRENCY, settings.INDEX_MAX_PAGES + 1))
+            results = await asyncio.gather(
+                *(self._fetch_api_page(parts, query, n) for n in batch)
+            )
+            new_refs = [
+                r
+                for page_refs in results
+                for r in self._refs_from_json(page_refs, index_url)
+                if normalize_url(r.url) not in seen
+            ]
+            if not new_refs:
+                break
+            seen.update(normalize_url(r.url) for r in new_refs)
+            refs.extend(new_refs)
+            next_page = batch.stop
+        return refs
+
+    async def _fetch_api_page(self, parts, query: dict, number: int):
+        query = {**query, "page": [str(number)]}
+        url = urlunparse(parts._replace(query=urlencode(query, doseq=True)))
+        async with self.sem:
+            try:
+                # context.request compartilha os cookies do navegador
+                resp = await self.session.context.request.get(url)
+                if resp.ok:
+                    return await resp.json()
+            except Exception as e:
+                print(f"    [!] Erro na API do índice ({url}): {e}")
+        return None
+
+    # ──────────────────────────────────────────────────────────
+    async def discover(self, index_url: str, reverse_fallback: bool = False) -> list[ChapterRef]:
+        print(f"[Índice] Analisando ({self.strategy}): {index_url}")
+
+        captured: list[tuple[str, object]] = []
+        api_pattern = re.compile(settings.INDEX_API_URL_PATTERN) if settings.INDEX_API_URL_PATTERN else None
+
+        async def on_response(response):
+            if api_pattern and api_pattern.search(response.url):
+                try:
+                    captured.append((response.url, await response.json()))
+                except Exception:
+                    pass
+
+        refs: list[ChapterRef] = []
+        first_html = None
+        for attempt in range(1, settings.MAX_RETRIES + 1):
+            captured.clear()
+            page = None
+            try:
+                page = await self.session.new_page()
+                if self.strategy in ("api", "auto"):
+                    page.on("response", on_response)
+                await page.goto(index_url, wait_until="domcontentloaded", timeout=60000)
+                await page.evaluate("window.scrollTo(0, 500)")
+                await asyncio.sleep(1)
+                self.initial_refs = self._links(await page.content(), index_url)
+
+                if self.strategy in ("scroll", "api", "auto"):
+                    refs = await self._discover_scroll(page, index_url)
+                else:
+                    refs = list(self.initial_refs)
+                first_html = await page.content()
+                break
+            except BrowserCrashError:
+                raise
+            except Exception as e:
+                print(
+                    f"[!] Erro ao carregar o índice "
+                    f"(tentativa {attempt}/{settings.MAX_RETRIES}): {e}"
+                )
+            finally:
+                if page:
+                    try:
+                        await page.close()
+                    except Exception:
+                        # Página de um navegador que caiu
+                        pass
+
+            if attempt < settings.MAX_RETRIES:
+                # Mesmo backoff dos capítulos: 10s, 20s, 30s...
+                wait_time = attempt * 10
+                print(f"    -> Aguardando {wait_time}s para tentar novamente...")
+                await asyncio.sleep(wait_time)
+
+        if first_html is None:
+            print(f"[✗] Falha definitiva ao carregar o índice: {index_url}")
+            return []
+
+        if self.strategy in ("api", "auto"):
+            refs.extend(await self._discover_api(captured, index_url))
+        if self.strategy in ("pagination", "auto"):
+            refs.extend(await self._discover_pagination(index_url, first_html))
+
+        if self.link_filter:
+            refs = [r for r in refs if self.link_filter(r.url)]
+
+        chapters = order_chapters(refs, reverse_fallback)
+        print(f"[Índice] Encontrados {len(chapters)} capítulos.")
+        return chapters
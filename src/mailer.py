@@ -5,6 +5,10 @@ from email.mime.base import MIMEBase
 from email import encoders
 import unicodedata
 import re
+from src import settings
+
+# Send-to-Kindle recusa anexos acima de ~50MB
+MAX_EMAIL_SIZE_MB = 50
 
 
 def normalize_for_email(text: str) -> str:
@@ -23,10 +27,13 @@ def normalize_for_email(text: str) -> str:
     return re.sub(r"_+", "_", clean_text)
 
 
-def send_to_kindle(epub_path: Path, kindle_email: str, gmail_user: str, gmail_pwd: str):
+def send_to_kindle(
+    epub_path: Path, kindle_email: str, gmail_user: str, gmail_pwd: str
+) -> bool:
+    """Envia o EPUB por email. Retorna True se o envio deu certo."""
     if not all([kindle_email, gmail_user, gmail_pwd]):
         print("[Email] Credenciais ausentes. Envio pulado.")
-        return
+        return False
 
     safe_filename = normalize_for_email(epub_path.name)
 
@@ -61,6 +68,27 @@ def send_to_kindle(epub_path: Path, kindle_email: str, gmail_user: str, gmail_pw
             server.sendmail(gmail_user, kindle_email, msg.as_string())
 
         print("[Email] Enviado com sucesso para o Kindle!")
+        return True
 
     except Exception as e:
         print(f"[Email] Erro crítico ao enviar: {e}")
+        return False
+
+
+def deliver(epub_path: Path) -> bool:
+    """Confere o tamanho e envia o EPUB para o Kindle configurado em settings."""
+    # Verifica tamanho antes de enviar (Send-to-Kindle limita a ~50MB)
+    file_size_mb = epub_path.stat().st_size / (1024 * 1024)
+    print(f"[Arquivo] Tamanho final: {file_size_mb:.2f} MB")
+
+    if file_size_mb > MAX_EMAIL_SIZE_MB:
+        print("[!] ATENÇÃO: Arquivo maior que 50MB. O envio por email vai falhar.")
+        print("[!] Recomendo passar via cabo USB ou usar 'Send to Kindle for Web'.")
+        return False
+
+    return send_to_kindle(
+        epub_path,
+        settings.KINDLE_EMAIL,
+        settings.GMAIL_ADDRESS,
+        settings.GMAIL_APP_PWD,
+    )
@@ -1,18 +1,31 @@
 import re
+from collections.abc import AsyncIterator
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from ebooklib import epub
-from src.models import Novel
+from src.cover import cover_file_name
+from src.epub_stream import StreamingEpubWriter
+from src.epub_zip import write_epub
+from src.models import Chapter, Novel
+from src import profiling
+from src.manga.slicer import slice_chapters
+from src import settings
 
 
 def sanitize_filename(name: str) -> str:
     return re.sub(r'[\\/*?:"<>|]', "", name).strip()
 
 
-def build_manga_epub(novel: Novel, base_output_dir: Path) -> Path:
+def _output_path(novel: Novel, base_output_dir: Path) -> Path:
     safe_title = sanitize_filename(novel.title)
     novel_dir = base_output_dir / safe_title
     novel_dir.mkdir(parents=True, exist_ok=True)
-    output_path = novel_dir / f"{safe_title}_Manga.epub"
+    return novel_dir / f"{safe_title}_Manga.epub"
+
+
+def _new_book(novel: Novel) -> tuple[epub.EpubBook, epub.EpubItem]:
+    """Cria o livro com metadados e CSS (tudo menos as páginas)."""
+    safe_title = sanitize_filename(novel.title)
 
     book = epub.EpubBook()
     book.set_identifier(f"manga-{safe_title.lower()}")
@@ -26,7 +39,10 @@ def build_manga_epub(novel: Novel, base_output_dir: Path) -> Path:
     )
     book.add_metadata(None, "meta", "comic", {"name": "book-type", "content": "comic"})
 
-    spine = []
+    # CAPA: primeira página do livro (o ebooklib cria a cover.xhtml)
+    if novel.cover_image:
+        book.set_cover(cover_file_name(novel.cover_media_type), novel.cover_image)
+        book.spine.append("cover")
 
     # Estilo Fullscreen para imagens
     style = """
@@ -39,49 +55,124 @@ def build_manga_epub(novel: Novel, base_output_dir: Path) -> Path:
         uid="style", file_name="style.css", media_type="text/css", content=style
     )
     book.add_item(css_item)
+    return book, css_item
+
+
+def _page_items(
+    img_bytes: bytes, page_count: int, css_item: epub.EpubItem
+) -> tuple[epub.EpubItem, epub.EpubHtml]:
+    # 1. Adiciona a imagem ao EPUB
+    img_name = f"image_{page_count:05d}.jpg"
+    img_item = epub.EpubItem(
+        uid=f"img_{page_count}",
+        file_name=f"images/{img_name}",
+        media_type="image/jpeg",
+        content=img_bytes,
+    )
+
+    # 2. Cria a página XHTML que exibe a imagem
+    page_name = f"page_{page_count:05d}.xhtml"
+    c_page = epub.EpubHtml(title=f"Page {page_count}", file_name=page_name)
+    c_page.content = f"""
+        <html>
+        <head><link rel="stylesheet" href="style.css" type="text/css"/></head>
+        <body>
+            <div class="fs">
+                <img src="images/{img_name}" alt="page"/>
+            </div>
+        </body>
+        </html>
+    """
+    c_page.add_item(css_item)
+    return img_item, c_page
+
+
+def build_manga_epub(
+    novel: Novel, base_output_dir: Path, slices_dir: Path | None = None
+) -> Path:
+    """`slices_dir`: cache das fatias (padrão: `slices/` ao lado do EPUB)."""
+    output_path = _output_path(novel, base_output_dir)
+    book, css_item = _new_book(novel)
+
+    spine = []
 
     print(f"[Builder] Montando EPUB com {len(novel.chapters)} capítulos...")
 
+    # Se content não for lista, pula (segurança)
+    chapter_pages = [
+        chap.content for chap in novel.chapters if isinstance(chap.content, list)
+    ]
+
+    # Webtoons: tiras muito longas viram várias páginas do tamanho da tela
+    if settings.SLICE_WEBTOON:
+        chapter_pages = slice_chapters(chapter_pages, slices_dir or output_path.parent / "slices")
+
     page_count = 1
-    for chap in novel.chapters:
-        # Se content não for lista, pula (segurança)
-        if not isinstance(chap.content, list):
-            continue
-
-        for img_bytes in chap.content:
-            # 1. Adiciona a imagem ao EPUB
-            img_name = f"image_{page_count:05d}.jpg"
-            img_item = epub.EpubItem(
-                uid=f"img_{page_count}",
-                file_name=f"images/{img_name}",
-                media_type="image/jpeg",
-                content=img_bytes,
-            )
+    for pages in chapter_pages:
+        for img_bytes in pages:
+            img_item, c_page = _page_items(img_bytes, page_count, css_item)
             book.add_item(img_item)
-
-            # 2. Cria a página XHTML que exibe a imagem
-            page_name = f"page_{page_count:05d}.xhtml"
-            c_page = epub.EpubHtml(title=f"Page {page_count}", file_name=page_name)
-            c_page.content = f"""
-                <html>
-                <head><link rel="stylesheet" href="style.css" type="text/css"/></head>
-                <body>
-                    <div class="fs">
-                        <img src="images/{img_name}" alt="page"/>
-                    </div>
-                </body>
-                </html>
-            """
-            c_page.add_item(css_item)
             book.add_item(c_page)
             spine.append(c_page)
 
             page_count += 1
 
-    book.spine = spine
+    book.spine.extend(spine)
     book.add_item(epub.EpubNcx())
     book.add_item(epub.EpubNav())
 
-    epub.write_epub(str(output_path), book)
+    write_epub(output_path, book)
+    print(f"[Builder] Mangá EPUB gerado: {output_path}")
+    return output_path
+
+
+async def build_manga_epub_stream(
+    novel: Novel, chapters: AsyncIterator[Chapter], base_output_dir: Path
+) -> Path | None:
+    """
+    Monta o EPUB do mangá conforme os capítulos chegam do scraper.
+    As imagens de cada capítulo vão para o arquivo e saem da memória em seguida.
+    """
+    output_path = _output_path(novel, base_output_dir)
+    book, css_item = _new_book(novel)
+    writer = StreamingEpubWriter(output_path, book).open()
+    slice_pool = ProcessPoolExecutor(settings.SLICE_WORKERS) if settings.SLICE_WEBTOON else None
+
+    def write_chapter(pages: list[bytes], first_page: int) -> list[epub.EpubHtml]:
+        if slice_pool:
+            pages = slice_chapters([pages], output_path.parent / "slices", slice_pool)[0]
+        written = []
+        for page_count, img_bytes in enumerate(pages, start=first_page):
+            img_item, c_page = _page_items(img_bytes, page_count, css_item)
+            writer.add_item(img_item)
+            written.append(writer.add_item(c_page))
+        return written
+
+    spine = []
+    try:
+        async for chap in chapters:
+            if not isinstance(chap.content, list):
+                continue
+            # Fatiar e comprimir é pesado: roda fora do event loop
+            with profiling.stage("epub_assembly"):
+                pages = await profiling.run_in_thread(
+                    "epub_assembly", write_chapter, chap.content, len(spine) + 1
+                )
+            spine.extend(pages)
+            print(f"[Builder] Cap {chap.index} gravado ({len(spine)} páginas no livro).")
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if slice_pool:
+            slice_pool.shutdown()
+
+    if not spine:
+        writer.abort()
+        return None
+
+    book.spine.extend(spine)
+    with profiling.stage("epub_assembly"):
+        writer.close()
     print(f"[Builder] Mangá EPUB gerado: {output_path}")
     return output_path
@@ -1,63 +1,129 @@
 import asyncio
 import httpx
+from collections.abc import AsyncIterator
 # import shutil
 from pathlib import Path
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
-from src.libs.stealth import stealth_async
-from src.models import Novel, Chapter
+from src.browser import BrowserCrashError, BrowserManager, ManagedContext
+from src.models import Novel, Chapter, ChapterRef
+from src.cache_manager import CacheManager
+from src.chapter_index import ChapterIndex
+from src.cover import fetch_cover
+from src.index_discovery import IndexDiscovery, normalize_url
+from src.manga.page_filter import filter_pages
+from src import profiling
+from src.session import cookies_to_client, cookies_to_context
 from src import settings
 
+# Marca a pasta de capítulo cujas páginas já passaram pelo filtro de lixo
+_FILTERED_MARKER = "filtered"
+
 
 class MangaScraper:
-    def __init__(self):
-        self.playwright = None
-        self.browser = None
+    def __init__(self, title=None, author=None, index_url=None, browser=None):
+        self.title = title or settings.NOVEL_TITLE
+        self.author = author or settings.NOVEL_AUTHOR
+        self.index_url = index_url or settings.MANGA_INDEX_URL
+        # Navegador externo (ex: daemon com navegador sempre aberto) não é fechado aqui
+        self.owns_browser = browser is None
+        self.browser = browser or BrowserManager()
+        # Mesmo User-Agent do httpx: cookies de challenge são presos a ele
+        self.session = ManagedContext(
+            self.browser,
+            self.index_url,
+            user_agent=settings.MANGA_HEADERS["User-Agent"],
+            viewport={"width": 1920, "height": 1080},
+        )
         self.client = None
+        self.cover_task = None
+        self.refs = None
+        self.safe_title = self.title.strip()  # Remove caracteres perigosos se necessário
+        self.chapter_index = ChapterIndex(
+            settings.OUTPUT_BASE_DIR / self.safe_title / "chapters"
+        )
+        # Cota de disco: esta obra fica protegida da limpeza enquanto o scraper roda
+        self.cache = CacheManager()
+
+    @property
+    def context(self):
+        """Contexto atual (muda quando o navegador é reciclado ou relançado)."""
+        return self.session.context
 
     async def __aenter__(self):
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(headless=True)
-        self.context = await self.browser.new_context(
-            viewport={"width": 1920, "height": 1080}
-        )
+        self.cache.begin(self.safe_title)
+        if self.owns_browser:
+            await self.browser.start()
+        await self.session.open()
         self.client = httpx.AsyncClient(
             headers=settings.MANGA_HEADERS, follow_redirects=True, timeout=20.0
         )
+        await cookies_to_client(self.context, self.client)
         return self
 
     async def __aexit__(self, *args):
+        if self.cover_task and not self.cover_task.done():
+            self.cover_task.cancel()
+        if self.session.is_healthy():
+            await cookies_to_context(self.client, self.context)
+        await self.session.close()
         await self.client.aclose()
-        await self.context.close()
-        await self.browser.close()
-        await self.playwright.stop()
-
-    def _get_chapter_dir(self, index: int) -> Path:
-        """Define o caminho da pasta para cada capítulo."""
-        # Ex: novels_output/Jujutsu Kaisen/chapters/chap_001
-        safe_title = (
-            settings.NOVEL_TITLE.strip()
-        )  # Remove caracteres perigosos se necessário
-        return settings.OUTPUT_BASE_DIR / safe_title / "chapters" / f"chap_{index:03d}"
-
-    def _save_images_to_disk(self, chapter_dir: Path, images: list[bytes]):
+        self.cache.end(self.safe_title)
+        if self.owns_browser:
+            await self.browser.stop()
+
+    def _get_chapter_dir(self, url: str) -> Path:
+        """Define o caminho da pasta para cada capítulo, chaveado pela URL."""
+        # Ex: novels_output/Jujutsu Kaisen/chapters/ch_3f2a9c...
+        return self.chapter_index.dir_for(url)
+
+    def _save_images_to_disk(self, chapter_dir: Path, images: list[bytes], url: str):
         """Salva as imagens baixadas no disco para cache."""
         chapter_dir.mkdir(parents=True, exist_ok=True)
+        (chapter_dir / "url.txt").write_text(url, encoding="utf-8")
         for i, img_bytes in enumerate(images, start=1):
             file_path = chapter_dir / f"image_{i:04d}.jpg"
             file_path.write_bytes(img_bytes)
+        if settings.FILTER_PAGES:
+            # Filtradas antes de gravar
+            (chapter_dir / _FILTERED_MARKER).touch()
+        self.cache.record(self.safe_title, chapter_dir)
 
     def _load_images_from_disk(self, chapter_dir: Path) -> list[bytes]:
         """Carrega imagens do disco se já existirem (resume)."""
-        images = []
         # Pega todos os arquivos jpg/jpeg/png e ordena pelo nome (importante!)
-        files = sorted(chapter_dir.glob("*.*"))
-        for f in files:
-            if f.suffix.lower() in [".jpg", ".jpeg", ".png", ".webp"]:
-                images.append(f.read_bytes())
+        files = [
+            f
+            for f in sorted(chapter_dir.glob("*.*"))
+            if f.suffix.lower() in [".jpg", ".jpeg", ".png", ".webp"]
+        ]
+        images = [f.read_bytes() for f in files]
+        if not images:
+            return images
+
+        marker = chapter_dir / _FILTERED_MARKER
+        if settings.FILTER_PAGES and not marker.exists():
+            # Cache de antes do filtro: filtra uma vez e apaga as páginas descartadas
+            kept = self._filter_pages(images)
+            kept_ids = {id(img) for img in kept}
+            for f, img in zip(files, images):
+                if id(img) not in kept_ids:
+                    f.unlink(missing_ok=True)
+            marker.touch()
+            images = kept
+        self.cache.touch(self.safe_title, chapter_dir)
         return images
 
+    @staticmethod
+    def _filter_pages(images: list[bytes]) -> list[bytes]:
+        """Remove páginas em branco, separadores e imagens de rastreamento."""
+        if not settings.FILTER_PAGES:
+            return images
+        kept = filter_pages(images)
+        if len(kept) < len(images):
+            print(f"    -> {len(images) - len(kept)} páginas descartadas (branco/lixo).")
+        return kept
+
     async def _download_image(self, url: str, sem: asyncio.Semaphore) -> bytes | None:
         async with sem:
             try:
@@ -70,7 +136,7 @@ class MangaScraper:
 
     async def extract_chapter_images(self, url: str, index: int) -> Chapter | None:
         # 1. VERIFICAÇÃO DE CACHE (Resume Logic)
-        chapter_dir = self._get_chapter_dir(index)
+        chapter_dir = self._get_chapter_dir(url)
 
         # Se a pasta existe e tem arquivos, assumimos que já foi baixado
         if chapter_dir.exists() and any(chapter_dir.iterdir()):
@@ -88,17 +154,20 @@ class MangaScraper:
         # 2. DOWNLOAD (Se não estiver no cache)
         print(f" -> [Download] Cap {index:03d}: {url}")
 
-        page = await self.context.new_page()
-        await stealth_async(page)
-
+        page = None
         try:
-            await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-
-            # Scroll para lazy loading
-            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            await asyncio.sleep(3)
-
-            html = await page.content()
+            # Stealth em cada página nova; relança o navegador se ele caiu
+            page = await self.session.new_page()
+            with profiling.stage("chapter_fetch"):
+                await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+
+                # Scroll para lazy loading
+                await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                await asyncio.sleep(3)
+
+                html = await page.content()
+            # Cookies obtidos pela página valem para o CDN das imagens
+            await cookies_to_client(self.context, self.client)
             soup = BeautifulSoup(html, "html.parser")
 
             img_urls = []
@@ -122,12 +191,16 @@ class MangaScraper:
 
             sem = asyncio.Semaphore(5)
             tasks = [self._download_image(u, sem) for u in img_urls]
-            images = await asyncio.gather(*tasks)
+            with profiling.stage("image_download"):
+                images = await asyncio.gather(*tasks)
             valid_images = [img for img in images if img]
+            await cookies_to_context(self.client, self.context)
+            # Decodifica miniaturas de todas as páginas: fora do event loop
+            valid_images = await asyncio.to_thread(self._filter_pages, valid_images)
 
             if valid_images:
                 # 3. SALVAR NO DISCO (Para não perder se o script parar depois)
-                self._save_images_to_disk(chapter_dir, valid_images)
+                self._save_images_to_disk(chapter_dir, valid_images, url)
 
             return Chapter(
                 title=f"Capítulo {index}",
@@ -136,85 +209,129 @@ class MangaScraper:
                 index=index,
             )
 
+        except BrowserCrashError:
+            raise
         except Exception as e:
             print(f"    [X] Erro crítico no capítulo: {e}")
             return None
         finally:
-            await page.close()
-
-    async def run(self, start=1, end=None) -> Novel:
-        novel = Novel(
-            title=settings.NOVEL_TITLE, author=settings.NOVEL_AUTHOR, is_manga=True
+            if page:
+                try:
+                    await page.close()
+                except Exception:
+                    # Página de um navegador que caiu
+                    pass
+
+    async def get_chapter_links(
+        self, index_url: str, manga_slug: str
+    ) -> list[ChapterRef]:
+        # Filtro de SLUG para garantir que é o mangá certo
+        discovery = IndexDiscovery(
+            self.session, first_match=False, link_filter=lambda url: manga_slug in url
         )
+        with profiling.stage("index_discovery"):
+            chapters = await discovery.discover(index_url, reverse_fallback=True)
+        # Caches antigos `chap_NNN` eram a posição na lista da primeira página do
+        # índice, filtrada pelo slug e invertida: refaz essa lista para migrá-los
+        legacy = [r for r in discovery.initial_refs if manga_slug in r.url]
+        legacy = list({normalize_url(r.url): r for r in legacy}.values())
+        legacy.reverse()
+        # Registra URL -> pasta (e migra caches antigos chaveados por posição)
+        self.chapter_index.register(chapters, legacy_refs=legacy)
+        return chapters
+
+    def start_cover(self):
+        """
+        Começa a buscar a capa em segundo plano (só quem vai montar o livro chama).
+        Chamado antes da descoberta do índice, as duas rodam em paralelo.
+        """
+        if self.cover_task is None:
+            self.cover_task = asyncio.create_task(
+                fetch_cover(self.client, self.title, self.index_url)
+            )
 
+    async def create_novel(self) -> Novel:
+        """Metadados da obra (título, autor, capa), sem os capítulos."""
+        novel = Novel(title=self.title, author=self.author, is_manga=True)
+        self.start_cover()
+        try:
+            cover = await self.cover_task
+        except Exception as e:
+            print(f"[Capa] Erro ao buscar a capa: {e}")
+            cover = None
+        if cover:
+            novel.cover_image = cover.data
+            novel.cover_media_type = cover.media_type
+        return novel
+
+    async def discover_chapters(self) -> list[ChapterRef]:
         # Filtro de SLUG para garantir que é o mangá certo
-        path_parts = urlparse(settings.MANGA_INDEX_URL).path.strip("/").split("/")
+        path_parts = urlparse(self.index_url).path.strip("/").split("/")
         manga_slug = path_parts[-1] if path_parts[-1] else path_parts[-2]
         print(f"[Filtro] Buscando apenas links contendo: '{manga_slug}'")
 
-        page = await self.context.new_page()
-        await page.goto(settings.MANGA_INDEX_URL, wait_until="domcontentloaded")
-        await page.evaluate("window.scrollTo(0, 500)")
-        await asyncio.sleep(1)
-
-        html = await page.content()
-        await page.close()
-
-        soup = BeautifulSoup(html, "html.parser")
+        # Ordem decrescente no site sem número nos links -> inverte para crescente
+        # Descobre uma vez só: o modo streaming descobre antes de montar o livro
+        if self.refs is None:
+            self.refs = await self.get_chapter_links(self.index_url, manga_slug)
+        return self.refs
 
-        raw_links = []
-        for sel in settings.CHAPTER_LINKS_SELECTOR.split(","):
-            found = soup.select(sel.strip())
-            if found:
-                raw_links.extend([link["href"] for link in found if link.get("href")])
+    def load_cached_chapter(self, url: str, index: int) -> Chapter | None:
+        """Lê um capítulo do cache sem tocar na rede."""
+        chap_dir = self._get_chapter_dir(url)
+        if not chap_dir.exists():
+            return None
+        imgs = self._load_images_from_disk(chap_dir)
+        if not imgs:
+            return None
+        return Chapter(title=f"Capítulo {index}", content=imgs, url=url, index=index)
+
+    async def fetch_chapter(self, url: str, index: int) -> Chapter | None:
+        chapter = await self.extract_chapter_images(url, index)
+        if not chapter and not self.session.is_healthy():
+            # O navegador caiu no meio do capítulo: a próxima página já o relança
+            chapter = await self.extract_chapter_images(url, index)
+
+        # Mesmo se falhar o download, verificamos se tem algo no disco
+        # (Caso raro onde o site falha mas tinhamos backup parcial)
+        if not chapter:
+            # Tenta carregar do disco uma última vez caso o scrape falhe
+            chapter = self.load_cached_chapter(url, index)
+            if chapter:
+                print(
+                    f"    [Info] Falha na rede, mas usando versão em disco para Cap {index}."
+                )
 
-        # Filtragem por slug
-        filtered_links = []
-        for link in raw_links:
-            if manga_slug in link:
-                filtered_links.append(link)
+        if chapter and chapter.content:
+            return chapter
+        print(f"    [!] Capítulo {index} ignorado (vazio ou erro).")
+        return None
 
-        unique_links = list(dict.fromkeys(filtered_links))
-        unique_links.reverse()  # Ajuste conforme a ordem do site (Decrescente -> Crescente)
+    async def iter_chapters(self, start=1, end=None) -> AsyncIterator[Chapter]:
+        """Entrega os capítulos um a um, na ordem, assim que ficam prontos."""
+        unique_links = await self.discover_chapters()
 
         if not unique_links:
             print("[Scraper] Nenhum capítulo encontrado.")
-            return novel
+            return
 
         end_idx = end if end else len(unique_links)
         target_links = unique_links[start - 1 : end_idx]
 
         print(f"[Manga] Processando {len(target_links)} capítulos (Cache + Download).")
 
-        for i, link in enumerate(target_links, start=start):
-            if not link.startswith("http"):
-                base_domain = "https://mangalivre.to"
-                link = (
-                    base_domain + link
-                    if link.startswith("/")
-                    else f"{base_domain}/{link}"
-                )
-
-            chapter = await self.extract_chapter_images(link, i)
-
-            # Mesmo se falhar o download, verificamos se tem algo no disco
-            # (Caso raro onde o site falha mas tinhamos backup parcial)
-            if not chapter:
-                # Tenta carregar do disco uma última vez caso o scrape falhe
-                chap_dir = self._get_chapter_dir(i)
-                if chap_dir.exists() and any(chap_dir.iterdir()):
-                    print(
-                        f"    [Info] Falha na rede, mas usando versão em disco para Cap {i}."
-                    )
-                    imgs = self._load_images_from_disk(chap_dir)
-                    chapter = Chapter(title=f"Cap {i}", content=imgs, url=link, index=i)
-
-            if chapter and chapter.content:
-                novel.chapters.append(chapter)
-            else:
-                print(f"    [!] Capítulo {i} ignorado (vazio ou erro).")
+        for i, ref in enumerate(target_links, start=start):
+            chapter = await self.fetch_chapter(ref.url, i)
+            if chapter:
+                yield chapter
 
             # Pequeno delay apenas se foi um download real (opcional, mantive fixo)
             await asyncio.sleep(0.5)
 
+    async def run(self, start=1, end=None) -> Novel:
+        # A capa baixa enquanto o índice é descoberto e os capítulos baixam
+        self.start_cover()
+        chapters = [chapter async for chapter in self.iter_chapters(start, end)]
+        novel = await self.create_novel()
+        novel.chapters = chapters
         return novel
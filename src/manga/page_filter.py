@@ -0,0 +1,62 @@
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from src import settings
+
+# Lado da miniatura em escala de cinza usada nas estatísticas
+_THUMB_SIZE = 64
+
+
+def _thumbnail(img_bytes: bytes) -> tuple[np.ndarray | None, int, int]:
+    """Decodifica só o necessário para uma miniatura 64x64 em cinza (e o tamanho real)."""
+    try:
+        with Image.open(BytesIO(img_bytes)) as img:
+            w, h = img.size
+            # JPEG: decodifica direto em escala reduzida (bem mais rápido)
+            img.draft("L", (_THUMB_SIZE, _THUMB_SIZE))
+            thumb = img.convert("L").resize((_THUMB_SIZE, _THUMB_SIZE))
+            return np.asarray(thumb, dtype=np.uint8), w, h
+    except Exception:
+        return None, 0, 0
+
+
+def junk_mask(images: list[bytes]) -> np.ndarray:
+    """
+    Marca as páginas descartáveis de um capítulo, calculando tudo em lote:
+    - pequenas demais (pixels de rastreamento, banners finos);
+    - quase sem variação de tom (páginas em branco/pretas, espaçadores);
+    - quase inteiramente brancas (separadores).
+    Imagens que não abrem também são marcadas. Tiras longas de webtoon nunca:
+    espremidas em 64x64, balões de fala somem no branco; o slicer cuida delas.
+    """
+    count = len(images)
+    stack = np.zeros((count, _THUMB_SIZE, _THUMB_SIZE), dtype=np.uint8)
+    dims = np.zeros((count, 2), dtype=np.int64)
+    broken = np.zeros(count, dtype=bool)
+    for i, img_bytes in enumerate(images):
+        thumb, w, h = _thumbnail(img_bytes)
+        if thumb is None:
+            broken[i] = True
+            continue
+        stack[i] = thumb
+        dims[i] = (w, h)
+
+    pixels = stack.reshape(count, -1).astype(np.float32)
+    stddev = pixels.std(axis=1)
+    white_ratio = (pixels >= settings.PAGE_WHITE_LEVEL).mean(axis=1)
+    tiny = (dims[:, 0] < settings.PAGE_MIN_WIDTH) | (dims[:, 1] < settings.PAGE_MIN_HEIGHT)
+    tall = dims[:, 1] >= settings.SLICE_MIN_RATIO * np.maximum(dims[:, 0], 1)
+
+    plain = (stddev < settings.PAGE_MIN_STDDEV) | (white_ratio >= settings.PAGE_MAX_WHITE_RATIO)
+    return broken | tiny | (plain & ~tall)
+
+
+def filter_pages(images: list[bytes]) -> list[bytes]:
+    """Remove as páginas descartáveis, mantendo a ordem. Nunca esvazia o capítulo."""
+    if not images:
+        return images
+    mask = junk_mask(images)
+    if mask.all():
+        # Provável falso positivo (ex: capítulo só de ilustrações claras)
+        return images
+    return [img for img, junk in zip(images, mask) if not junk]
@@ -0,0 +1,160 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from itertools import repeat
+from pathlib import Path
+from PIL import Image
+from src import settings
+
+# Largura da cópia em escala de cinza usada para achar as "calhas" (faixas lisas)
+_PROBE_WIDTH = 64
+
+
+def _is_tall_strip(img_bytes: bytes) -> bool:
+    """Lê só o cabeçalho da imagem para saber se é uma tira longa de webtoon."""
+    try:
+        with Image.open(BytesIO(img_bytes)) as img:
+            w, h = img.size
+    except Exception:
+        return False
+    return w > 0 and h / w >= settings.SLICE_MIN_RATIO
+
+
+def _cache_key(img_bytes: bytes) -> str:
+    # Todos os parâmetros do corte entram na chave: ajustar qualquer um invalida o cache
+    params = ":".join(
+        str(p)
+        for p in (
+            settings.DEVICE_ASPECT_RATIO,
+            settings.SLICE_MIN_RATIO,
+            settings.SLICE_SEARCH_WINDOW,
+            settings.SLICE_GUTTER_TOLERANCE,
+            settings.SLICE_JPEG_QUALITY,
+        )
+    )
+    return hashlib.sha1(img_bytes + params.encode()).hexdigest()
+
+
+def _gutter_rows(img: Image.Image) -> list[bool]:
+    """Marca as linhas sem conteúdo (cor uniforme), analisando uma cópia estreita."""
+    w, h = img.size
+    probe = img.convert("L").resize((min(w, _PROBE_WIDTH), h))
+    pw = probe.size[0]
+    data = probe.tobytes()
+    probe.close()
+
+    tolerance = settings.SLICE_GUTTER_TOLERANCE
+    rows = []
+    for y in range(h):
+        row = data[y * pw : (y + 1) * pw]
+        rows.append(max(row) - min(row) <= tolerance)
+    return rows
+
+
+def _find_cuts(rows: list[bool], page_h: int) -> list[int]:
+    """Escolhe as linhas de corte mais próximas da altura ideal de página."""
+    height = len(rows)
+    window = max(1, int(page_h * settings.SLICE_SEARCH_WINDOW))
+    cuts = []
+    start = 0
+
+    # Sobra pequena no final fica junto com a última página
+    while height - start > page_h * (1 + settings.SLICE_SEARCH_WINDOW):
+        ideal = start + page_h
+        best = None
+        for offset in range(window + 1):
+            # Procura para cima primeiro (página menor cabe melhor na tela)
+            for y in (ideal - offset, ideal + offset):
+                if start < y < height and rows[y]:
+                    best = y
+                    break
+            if best is not None:
+                break
+
+        cut = best if best is not None else ideal
+        cuts.append(cut)
+        start = cut
+
+    return cuts
+
+
+def slice_strip(img_bytes: bytes, cache_dir: str) -> list[bytes]:
+    """
+    Corta uma tira longa em páginas no formato da tela.
+    Roda em um processo do pool: cada worker segura apenas uma imagem por vez.
+    """
+    out_dir = Path(cache_dir) / _cache_key(img_bytes)
+    done_marker = out_dir / "done"
+    if done_marker.exists():
+        try:
+            # Data da pasta = último acesso (LRU da cota de disco)
+            os.utime(out_dir)
+            return [f.read_bytes() for f in sorted(out_dir.glob("slice_*.jpg"))]
+        except OSError:
+            # Removida pela cota no meio da leitura: fatia de novo
+            pass
+
+    with Image.open(BytesIO(img_bytes)) as img:
+        w, h = img.size
+        page_h = int(w * settings.DEVICE_ASPECT_RATIO)
+        cuts = _find_cuts(_gutter_rows(img), page_h)
+        if not cuts:
+            return [img_bytes]
+
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+
+        out_dir.mkdir(parents=True, exist_ok=True)
+        slices = []
+        bounds = [0] + cuts + [h]
+        for i, (top, bottom) in enumerate(zip(bounds, bounds[1:])):
+            buf = BytesIO()
+            img.crop((0, top, w, bottom)).save(
+                buf, "JPEG", quality=settings.SLICE_JPEG_QUALITY
+            )
+            data = buf.getvalue()
+            (out_dir / f"slice_{i:03d}.jpg").write_bytes(data)
+            slices.append(data)
+
+    done_marker.touch()
+    return slices
+
+
+def slice_chapters(
+    chapters: list[list[bytes]],
+    cache_dir: Path,
+    pool: ProcessPoolExecutor | None = None,
+) -> list[list[bytes]]:
+    """
+    Substitui as tiras longas de cada capítulo pelas suas fatias, mantendo a ordem.
+    Imagens normais passam direto, sem ir para o pool.
+    Passe `pool` para reaproveitar os processos entre chamadas (modo streaming).
+    """
+    tall = [
+        (ci, ii)
+        for ci, images in enumerate(chapters)
+        for ii, img in enumerate(images)
+        if _is_tall_strip(img)
+    ]
+    if not tall:
+        return chapters
+
+    print(f"[Slicer] Fatiando {len(tall)} tiras longas...")
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    strips = [chapters[ci][ii] for ci, ii in tall]
+    if pool:
+        sliced = dict(zip(tall, pool.map(slice_strip, strips, repeat(str(cache_dir)))))
+    else:
+        with ProcessPoolExecutor(max_workers=settings.SLICE_WORKERS) as own_pool:
+            results = own_pool.map(slice_strip, strips, repeat(str(cache_dir)))
+            sliced = dict(zip(tall, results))
+
+    return [
+        [
+            page
+            for ii, img in enumerate(images)
+            for page in sliced.get((ci, ii), [img])
+        ]
+        for ci, images in enumerate(chapters)
+    ]
@@ -1,6 +1,13 @@
 from dataclasses import dataclass, field
 
 
+@dataclass
+class ChapterRef:
+    url: str
+    number: float | None = None
+    title: str = ""
+
+
 @dataclass
 class Chapter:
     title: str
@@ -1,21 +1,31 @@
 import re
+from collections.abc import AsyncIterator
 from pathlib import Path
 from ebooklib import epub
-from src.models import Novel
+from src.cover import cover_file_name
+from src.epub_stream import StreamingEpubWriter
+from src.epub_zip import write_epub
+from src.models import Chapter, Novel
+from src import profiling
 
 
 def sanitize_filename(name: str) -> str:
     return re.sub(r'[\\/*?:"<>|]', "", name).strip()
 
 
-def build_epub(novel: Novel, base_output_dir: Path) -> Path:
+def _output_path(novel: Novel, base_output_dir: Path) -> Path:
     safe_title = sanitize_filename(novel.title)
 
     # 1. Cria pasta específica para a novel
     novel_dir = base_output_dir / safe_title
     novel_dir.mkdir(parents=True, exist_ok=True)
 
-    output_path = novel_dir / f"{safe_title}.epub"
+    return novel_dir / f"{safe_title}.epub"
+
+
+def _new_book(novel: Novel) -> tuple[epub.EpubBook, epub.EpubItem]:
+    """Cria o livro com metadados, capa e CSS (tudo menos os capítulos)."""
+    safe_title = sanitize_filename(novel.title)
 
     book = epub.EpubBook()
     book.set_identifier(f"id-{safe_title.lower().replace(' ', '-')}")
@@ -25,17 +35,20 @@ def build_epub(novel: Novel, base_output_dir: Path) -> Path:
 
     # CAPA
     if novel.cover_image:
-        # Define a imagem interna do EPUB (usada como thumbnail)
-        book.set_cover("cover.jpg", novel.cover_image)
+        cover_name = cover_file_name(novel.cover_media_type)
+        # Define a imagem interna do EPUB (usada como thumbnail).
+        # A página da capa é criada abaixo, então não deixa o ebooklib criar outra
+        # com o mesmo nome (cover.xhtml duplicado no zip)
+        book.set_cover(cover_name, novel.cover_image, create_page=False)
 
         # Cria uma página HTML explícita para a capa (Para abrir nela ao ler)
         cover_page = epub.EpubHtml(title="Capa", file_name="cover.xhtml", lang="pt")
-        cover_page.content = """
+        cover_page.content = f"""
         <html>
             <head>
                 <style type="text/css">
-                    @page { margin: 0; padding: 0; }
-                    html, body {
+                    @page {{ margin: 0; padding: 0; }}
+                    html, body {{
                         margin: 0;
                         padding: 0;
                         height: 100vh; /* Ocupa toda altura da tela */
@@ -47,8 +60,8 @@ def build_epub(novel: Novel, base_output_dir: Path) -> Path:
                         justify-content: center;
                         align-items: center;
                         overflow: hidden; /* Evita barras de rolagem */
-                    }
-                    img {
+                    }}
+                    img {{
                         /* Tenta ocupar o máximo de largura e altura possível
                            mantendo a proporção (aspect ratio) */
                         max-width: 100%;
@@ -57,11 +70,11 @@ def build_epub(novel: Novel, base_output_dir: Path) -> Path:
                         width: auto;
                         /* Garante que a imagem não estique, mas preencha o espaço */
                         object-fit: contain; 
-                    }
+                    }}
                 </style>
             </head>
             <body>
-                <div> <img src="cover.jpg" alt="Capa" />
+                <div> <img src="{cover_name}" alt="Capa" />
                 </div>
             </body>
         </html>
@@ -80,15 +93,26 @@ def build_epub(novel: Novel, base_output_dir: Path) -> Path:
         uid="style_nav", file_name="style/nav.css", media_type="text/css", content=style
     )
     book.add_item(nav_css)
+    return book, nav_css
+
+
+def _chapter_item(chap: Chapter, nav_css: epub.EpubItem) -> epub.EpubHtml:
+    c_item = epub.EpubHtml(
+        title=chap.title, file_name=f"chap_{chap.index:04d}.xhtml", lang="pt"
+    )
+    c_item.content = f"<h1>{chap.title}</h1>{chap.content}"
+    c_item.add_item(nav_css)
+    return c_item
+
+
+def build_epub(novel: Novel, base_output_dir: Path) -> Path:
+    output_path = _output_path(novel, base_output_dir)
+    book, nav_css = _new_book(novel)
 
     # Capítulos
     epub_chapters = []
     for chap in novel.chapters:
-        c_item = epub.EpubHtml(
-            title=chap.title, file_name=f"chap_{chap.index:04d}.xhtml", lang="pt"
-        )
-        c_item.content = f"<h1>{chap.title}</h1>{chap.content}"
-        c_item.add_item(nav_css)
+        c_item = _chapter_item(chap, nav_css)
         book.add_item(c_item)
         epub_chapters.append(c_item)
 
@@ -97,6 +121,40 @@ def build_epub(novel: Novel, base_output_dir: Path) -> Path:
     book.add_item(epub.EpubNcx())
     book.add_item(epub.EpubNav())
 
-    epub.write_epub(str(output_path), book)
+    write_epub(output_path, book)
+    print(f"[EPUB] Arquivo gerado em: {output_path}")
+    return output_path
+
+
+async def build_epub_stream(
+    novel: Novel, chapters: AsyncIterator[Chapter], base_output_dir: Path
+) -> Path | None:
+    """
+    Monta o EPUB conforme os capítulos chegam do scraper.
+    Cada capítulo é gravado no arquivo e descartado, então a memória não cresce
+    com o tamanho do livro.
+    """
+    output_path = _output_path(novel, base_output_dir)
+    book, nav_css = _new_book(novel)
+    writer = StreamingEpubWriter(output_path, book).open()
+
+    epub_chapters = []
+    try:
+        async for chap in chapters:
+            with profiling.stage("epub_assembly"):
+                epub_chapters.append(writer.add_item(_chapter_item(chap, nav_css)))
+            print(f"[EPUB] Cap {chap.index} gravado ({len(epub_chapters)} no livro).")
+    except BaseException:
+        writer.abort()
+        raise
+
+    if not epub_chapters:
+        writer.abort()
+        return None
+
+    book.toc = epub_chapters
+    book.spine.extend(["nav"] + epub_chapters)
+    with profiling.stage("epub_assembly"):
+        writer.close()
     print(f"[EPUB] Arquivo gerado em: {output_path}")
     return output_path
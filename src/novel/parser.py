@@ -0,0 +1,32 @@
+from bs4 import BeautifulSoup
+from src.cleaner import clean_html_content, minify_html_content
+from src import settings
+
+
+def parse_chapter_html(html: str, index: int) -> tuple[str, str, int, int] | None:
+    """
+    Extrai título e conteúdo limpo do HTML bruto de um capítulo.
+    Roda dentro de um processo do pool, então recebe e devolve apenas tipos simples.
+    Retorna (título, html, bytes antes da normalização, bytes depois).
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    title = f"Capítulo {index}"
+    for sel in settings.TITLE_SELECTORS:
+        if el := soup.select_one(sel):
+            title = el.get_text(strip=True)
+            break
+
+    content_el = None
+    for sel in settings.CONTENT_SELECTORS:
+        if content_el := soup.select_one(sel):
+            break
+
+    if not content_el:
+        return None
+
+    clean = clean_html_content(content_el)
+    size_before = len(clean.encode("utf-8"))
+    if settings.MINIFY_HTML:
+        clean = minify_html_content(clean)
+    return title, clean, size_before, len(clean.encode("utf-8"))
@@ -1,62 +1,108 @@
 import asyncio
 import random
 import httpx
+from collections import deque
+from collections.abc import AsyncIterator
 from pathlib import Path
-from urllib.parse import urljoin
-from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
-
-# Importação da biblioteca de furtividade
-from src.libs.stealth import stealth_async
-from src.models import Novel, Chapter
-from src.cleaner import clean_html_content
+from src.browser import BrowserCrashError, BrowserManager, ManagedContext
+from src.models import Novel, Chapter, ChapterRef
+from src.cache_manager import CacheManager
+from src.chapter_index import ChapterIndex
+from src.cover import fetch_cover
+from src.index_discovery import IndexDiscovery
+from src.session import cookies_to_client, cookies_to_context
+from src.novel.parser import parse_chapter_html
+from src.workers import ProcessStage
+from src import profiling
 from src import settings
 
+# Flags para evitar detecção de automação
+BROWSER_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-infobars",
+    "--disable-dev-shm-usage",
+    "--disable-browser-side-navigation",
+    "--disable-features=VizDisplayCompositor",
+]
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
 
-class NovelScraper:
-    def __init__(self):
-        self.playwright = None
-        self.browser = None
-        self.context = None
 
-    async def __aenter__(self):
-        self.playwright = await async_playwright().start()
-        # Flags para evitar detecção de automação
-        args = [
-            "--disable-blink-features=AutomationControlled",
-            "--no-sandbox",
-            "--disable-infobars",
-            "--disable-dev-shm-usage",
-            "--disable-browser-side-navigation",
-            "--disable-features=VizDisplayCompositor",
-        ]
-        self.browser = await self.playwright.chromium.launch(headless=True, args=args)
-        self.context = await self.browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+def _resolved(value) -> asyncio.Future:
+    """Future já concluído (capítulo do cache ou falha no download)."""
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(value)
+    return future
+
+
+class NovelScraper:
+    def __init__(self, title=None, author=None, index_url=None, browser=None):
+        self.title = title or settings.NOVEL_TITLE
+        self.author = author or settings.NOVEL_AUTHOR
+        self.index_url = index_url or settings.INDEX_URL
+        # Navegador externo (ex: daemon com navegador sempre aberto) não é fechado aqui
+        self.owns_browser = browser is None
+        self.browser = browser or BrowserManager(BROWSER_ARGS)
+        self.session = ManagedContext(
+            self.browser,
+            self.index_url,
+            user_agent=USER_AGENT,
             viewport={"width": 1920, "height": 1080},
             locale="pt-BR",
         )
+        self.safe_title = self.title.strip()
+        self.chapter_index = ChapterIndex(
+            settings.OUTPUT_BASE_DIR / self.safe_title / "chapters"
+        )
+        # Cota de disco: esta obra fica protegida da limpeza enquanto o scraper roda
+        self.cache = CacheManager()
+        self.client = None
+        self.cover_task = None
+        self.refs = None
+        # Parse + limpeza dos capítulos rodam fora do event loop, em paralelo com o
+        # download do capítulo seguinte (os downloads são sequenciais)
+        self.parse_stage = ProcessStage(
+            settings.PARSE_WORKERS, settings.PARSE_MAX_PENDING
+        )
 
-        # Aplica a máscara de furtividade na página
-        page = await self.context.new_page()
-        await stealth_async(page)
-        await page.close()
+    @property
+    def context(self):
+        """Contexto atual (muda quando o navegador é reciclado ou relançado)."""
+        return self.session.context
 
+    async def __aenter__(self):
+        self.parse_stage.start()
+        self.cache.begin(self.safe_title)
+        if self.owns_browser:
+            await self.browser.start()
+        # Restaura cookies/liberação de challenge salvos de execuções anteriores
+        await self.session.open()
+
+        # Mesmo User-Agent e cookies do navegador (cookies de challenge são
+        # presos ao User-Agent)
+        self.client = httpx.AsyncClient(
+            headers={"User-Agent": USER_AGENT}, follow_redirects=True, timeout=20.0
+        )
+        await cookies_to_client(self.context, self.client)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.context:
-            await self.context.close()
-        if self.browser:
-            await self.browser.close()
-        if self.playwright:
-            await self.playwright.stop()
-
-    def _get_chapter_dir(self, index: int) -> Path:
-        """Define o caminho da pasta para cada capítulo (cache)."""
-        # Ex: novels_output/Nome da Novel/chapters/chap_001
-        safe_title = settings.NOVEL_TITLE.strip()
-        return settings.OUTPUT_BASE_DIR / safe_title / "chapters" / f"chap_{index:03d}"
+        self.parse_stage.shutdown()
+        self.cache.end(self.safe_title)
+        if self.cover_task and not self.cover_task.done():
+            self.cover_task.cancel()
+        # Cookies recebidos pelo httpx (capa) voltam ao navegador antes de salvar a sessão
+        if self.session.is_healthy():
+            await cookies_to_context(self.client, self.context)
+        await self.client.aclose()
+        await self.session.close()
+        if self.owns_browser:
+            await self.browser.stop()
+
+    def _get_chapter_dir(self, url: str) -> Path:
+        """Define o caminho da pasta para cada capítulo (cache), chaveado pela URL."""
+        # Ex: novels_output/Nome da Novel/chapters/ch_3f2a9c...
+        return self.chapter_index.dir_for(url)
 
     def _save_chapter_to_disk(self, chapter_dir: Path, chapter: Chapter):
         """Salva o conteúdo do capítulo (HTML) no disco."""
@@ -68,6 +114,7 @@ class NovelScraper:
         file_path.write_text(chapter.content, encoding="utf-8")
         (chapter_dir / "title.txt").write_text(chapter.title, encoding="utf-8")
         (chapter_dir / "url.txt").write_text(chapter.url, encoding="utf-8")
+        self.cache.record(self.safe_title, chapter_dir)
 
     def _load_chapter_from_disk(self, chapter_dir: Path, index: int) -> Chapter | None:
         """Carrega capítulo do disco se existir."""
@@ -79,17 +126,18 @@ class NovelScraper:
             content = content_path.read_text(encoding="utf-8")
             title = title_path.read_text(encoding="utf-8")
             url = url_path.read_text(encoding="utf-8") if url_path.exists() else ""
+            self.cache.touch(self.safe_title, chapter_dir)
             return Chapter(title=title, content=content, url=url, index=index)
         return None
 
     async def _fetch_html_with_retry(self, url: str) -> str | None:
         """Tenta baixar o HTML com mecanismo de retry e backoff exponencial."""
         for attempt in range(1, settings.MAX_RETRIES + 1):
-            page = await self.context.new_page()
-            # Garante stealth em cada nova página
-            await stealth_async(page)
-
+            page = None
             try:
+                # Stealth em cada página nova; relança o navegador se ele caiu
+                page = await self.session.new_page()
+
                 # Timeout maior para conexões lentas
                 await page.goto(url, wait_until="domcontentloaded", timeout=60000)
 
@@ -97,136 +145,82 @@ class NovelScraper:
                 await page.evaluate("window.scrollTo(0, document.body.scrollHeight/2)")
                 await asyncio.sleep(random.uniform(0.5, 1.5))
 
-                content = await page.content()
-                await page.close()
-                return content
+                return await page.content()
 
+            except BrowserCrashError:
+                raise
             except Exception as e:
                 print(
                     f"[!] Erro na tentativa {attempt}/{settings.MAX_RETRIES} para {url}: {e}"
                 )
-                await page.close()
-                if attempt < settings.MAX_RETRIES:
-                    # Backoff: Espera 10s, depois 20s, depois 30s...
-                    wait_time = attempt * 10
-                    print(f"    -> Aguardando {wait_time}s para tentar novamente...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    print(f"[✗] Falha definitiva em: {url}")
-                    return None
-
-    # ── LÓGICA DE CAPA ─────────────────────────────────────────
-    async def _get_cover_image(self, index_url: str) -> bytes | None:
-        # Primeiro verifica se tem imagem salva localmente na pasta da novel (cache manual)
-        safe_title = settings.NOVEL_TITLE.strip()
-        local_cache_path = settings.OUTPUT_BASE_DIR / safe_title / "cover.jpg"
-
-        if settings.COVER_MODE == "local":
-            path = Path(settings.COVER_FILE_PATH)
-            if path.exists():
-                return path.read_bytes()
-            # Se não achar no path configurado, tenta no cache padrão
-            if local_cache_path.exists():
-                return local_cache_path.read_bytes()
-            return None
-
-        # Verifica cache automático antes de baixar
-        if local_cache_path.exists():
-            print("[Capa] Usando capa em cache do disco.")
-            return local_cache_path.read_bytes()
-
-        print("[Capa] Buscando capa no site...")
-        html = await self._fetch_html_with_retry(index_url)
-        if not html:
-            return None
-
-        soup = BeautifulSoup(html, "html.parser")
-        img_url = None
-        for sel in (
-            settings.COVER_SELECTORS
-        ):  # Assumindo que você tem COVER_SELECTORS no settings
-            # Se não tiver, substitua por uma lista hardcoded ou adicione no settings
-            # Ex: settings.COVER_SELECTORS = [".book-cover img", ".novel-cover img"]
-            if img := soup.select_one(sel):
-                img_url = img.get("src") or img.get("data-src")
-                if img_url:
-                    break
-
-        if not img_url:
-            return None
-
-        full_url = urljoin(index_url, img_url)
-        try:
-            # Tenta baixar a imagem com headers de navegador real
-            headers = {"User-Agent": "Mozilla/5.0"}
-            async with httpx.AsyncClient(
-                headers=headers, follow_redirects=True
-            ) as client:
-                resp = await client.get(full_url, timeout=15)
-                if resp.status_code == 200:
-                    # Salva no cache
-                    local_cache_path.parent.mkdir(parents=True, exist_ok=True)
-                    local_cache_path.write_bytes(resp.content)
-                    return resp.content
-        except Exception:
-            pass
+            finally:
+                if page:
+                    try:
+                        await page.close()
+                    except Exception:
+                        # Página de um navegador que caiu
+                        pass
+
+            if attempt < settings.MAX_RETRIES:
+                # Backoff: Espera 10s, depois 20s, depois 30s...
+                wait_time = attempt * 10
+                print(f"    -> Aguardando {wait_time}s para tentar novamente...")
+                await asyncio.sleep(wait_time)
+
+        print(f"[✗] Falha definitiva em: {url}")
         return None
 
-    # ──────────────────────────────────────────────────────────
-
-    async def get_chapter_links(self, index_url: str) -> list[str]:
-        print(f"[Scraper] Analisando índice: {index_url}")
-        html = await self._fetch_html_with_retry(index_url)
-        if not html:
-            return []
-
-        soup = BeautifulSoup(html, "html.parser")
-        links = []
-        for sel in settings.CHAPTER_LINKS_SELECTOR.split(","):
-            found = soup.select(sel.strip())
-            if found:
-                links = [urljoin(index_url, a["href"]) for a in found if a.get("href")]
-                break
-
-        unique = list(dict.fromkeys(links))
-        # Se a ordem estiver invertida (Capítulo final primeiro), inverta:
-        # unique.reverse()
-        print(f"[Scraper] Encontrados {len(unique)} capítulos.")
-        return unique
+    async def get_chapter_links(self, index_url: str) -> list[ChapterRef]:
+        discovery = IndexDiscovery(self.session)
+        with profiling.stage("index_discovery"):
+            chapters = await discovery.discover(index_url)
+        # Registra URL -> pasta (e migra caches antigos chaveados por posição)
+        self.chapter_index.register(chapters)
+        return chapters
 
     async def extract_chapter(self, url: str, index: int) -> Chapter | None:
+        return await (await self._begin_chapter(url, index))
+
+    async def _begin_chapter(self, url: str, index: int) -> asyncio.Future:
+        """
+        Lê o capítulo do cache ou baixa o HTML. O parse segue em uma task, para
+        que o próximo download comece enquanto este capítulo é processado.
+        """
         # 1. VERIFICAÇÃO DE CACHE
-        chapter_dir = self._get_chapter_dir(index)
+        chapter_dir = self._get_chapter_dir(url)
         cached_chapter = self._load_chapter_from_disk(chapter_dir, index)
 
         if cached_chapter:
             print(f" -> [Cache] Cap {index:03d} carregado do disco.")
-            return cached_chapter
+            return _resolved(cached_chapter)
 
         # 2. DOWNLOAD (Se não estiver no cache)
         print(f" -> [Download] Cap {index:03d}: {url}")
-        html = await self._fetch_html_with_retry(url)
+        with profiling.stage("chapter_fetch"):
+            html = await self._fetch_html_with_retry(url)
         if not html:
-            return None
-
-        soup = BeautifulSoup(html, "html.parser")
+            return _resolved(None)
 
-        title = f"Capítulo {index}"
-        for sel in settings.TITLE_SELECTORS:
-            if el := soup.select_one(sel):
-                title = el.get_text(strip=True)
-                break
+        return asyncio.create_task(self._parse_chapter(url, index, chapter_dir, html))
 
-        content_el = None
-        for sel in settings.CONTENT_SELECTORS:
-            if content_el := soup.select_one(sel):
-                break
-
-        if not content_el:
+    async def _parse_chapter(
+        self, url: str, index: int, chapter_dir: Path, html: str
+    ) -> Chapter | None:
+        # Parse/limpeza fora do event loop (não trava o download seguinte)
+        parsed = await profiling.run_in_stage(
+            self.parse_stage, "cleaning", parse_chapter_html, html, index
+        )
+        if not parsed:
             print(f"    [!] Conteúdo não encontrado para: {url}")
             return None
 
-        clean = clean_html_content(content_el)
+        title, clean, size_before, size_after = parsed
+        if size_before > size_after:
+            saved = size_before - size_after
+            print(
+                f"    -> HTML normalizado: {size_before / 1024:.1f} KB -> "
+                f"{size_after / 1024:.1f} KB (-{saved * 100 / size_before:.0f}%)"
+            )
 
         # Cria o objeto capítulo
         chapter = Chapter(title=title, content=clean, url=url, index=index)
@@ -236,13 +230,48 @@ class NovelScraper:
 
         return chapter
 
-    async def run(self, start=1, end=None) -> Novel:
-        novel = Novel(title=settings.NOVEL_TITLE, author=settings.NOVEL_AUTHOR)
-        novel.cover_image = await self._get_cover_image(settings.INDEX_URL)
+    def start_cover(self):
+        """
+        Começa a buscar a capa em segundo plano (só quem vai montar o livro chama).
+        Chamado antes da descoberta do índice, as duas rodam em paralelo.
+        """
+        if self.cover_task is None:
+            self.cover_task = asyncio.create_task(
+                fetch_cover(self.client, self.title, self.index_url, self._fetch_html_with_retry)
+            )
+
+    async def create_novel(self) -> Novel:
+        """Metadados da obra (título, autor, capa), sem os capítulos."""
+        novel = Novel(title=self.title, author=self.author)
+        self.start_cover()
+        try:
+            cover = await self.cover_task
+        except Exception as e:
+            print(f"[Capa] Erro ao buscar a capa: {e}")
+            cover = None
+        if cover:
+            novel.cover_image = cover.data
+            novel.cover_media_type = cover.media_type
+        return novel
 
-        links = await self.get_chapter_links(settings.INDEX_URL)
+    async def discover_chapters(self) -> list[ChapterRef]:
+        # Descobre uma vez só: o modo streaming descobre antes de montar o livro
+        if self.refs is None:
+            self.refs = await self.get_chapter_links(self.index_url)
+        return self.refs
+
+    async def fetch_chapter(self, url: str, index: int) -> Chapter | None:
+        return await self.extract_chapter(url, index)
+
+    def load_cached_chapter(self, url: str, index: int) -> Chapter | None:
+        """Lê um capítulo do cache sem tocar na rede."""
+        return self._load_chapter_from_disk(self._get_chapter_dir(url), index)
+
+    async def iter_chapters(self, start=1, end=None) -> AsyncIterator[Chapter]:
+        """Entrega os capítulos um a um, na ordem, assim que ficam prontos."""
+        links = await self.discover_chapters()
         if not links:
-            return novel
+            return
 
         end_idx = end if end else len(links)
         target_links = links[start - 1 : end_idx]
@@ -251,26 +280,45 @@ class NovelScraper:
             f"[Scraper] Processando {len(target_links)} capítulos (Cache + Download)..."
         )
 
-        for i, link in enumerate(target_links, start=start):
-            # A extração agora gerencia o cache internamente
-            chapter = await self.extract_chapter(link, i)
-
-            if chapter:
-                novel.chapters.append(chapter)
- 
-
-            # Moverei o delay para dentro do loop apenas se NÃO for cache:
-            chapter_dir = self._get_chapter_dir(i)
-
-            # Hack rápido: se a pasta do proximo capitulo não existe, sleep.
-            next_chap_dir = self._get_chapter_dir(i + 1)
-            if not next_chap_dir.exists():
-                delay = random.uniform(
-                    settings.REQUEST_DELAY_MIN, settings.REQUEST_DELAY_MAX
-                )
-                if i % 10 == 0:
-                    print("    (Pausa para descanso de 10s...)")
-                    delay = 10.0
-                await asyncio.sleep(delay)
+        # Parses em andamento, na ordem: rodam enquanto o próximo capítulo baixa
+        # (e durante a pausa). Com PARSE_MAX_PENDING na fila, o download espera
+        pending: deque[asyncio.Future] = deque()
+        try:
+            for pos, ref in enumerate(target_links):
+                i = start + pos
+                # A extração agora gerencia o cache internamente
+                pending.append(await self._begin_chapter(ref.url, i))
+                while pending and (
+                    pending[0].done() or len(pending) > settings.PARSE_MAX_PENDING
+                ):
+                    if chapter := await pending.popleft():
+                        yield chapter
+
+                # Hack rápido: se a pasta do proximo capitulo não existe, sleep.
+                if pos + 1 >= len(target_links):
+                    break
+                next_chap_dir = self._get_chapter_dir(target_links[pos + 1].url)
+                if not next_chap_dir.exists():
+                    delay = random.uniform(
+                        settings.REQUEST_DELAY_MIN, settings.REQUEST_DELAY_MAX
+                    )
+                    if i % 10 == 0:
+                        print("    (Pausa para descanso de 10s...)")
+                        delay = 10.0
+                    await asyncio.sleep(delay)
+
+            while pending:
+                if chapter := await pending.popleft():
+                    yield chapter
+        finally:
+            # Consumidor parou no meio (ou erro): não deixa parse órfão
+            for future in pending:
+                future.cancel()
 
+    async def run(self, start=1, end=None) -> Novel:
+        # A capa baixa enquanto o índice é descoberto e os capítulos baixam
+        self.start_cover()
+        chapters = [chapter async for chapter in self.iter_chapters(start, end)]
+        novel = await self.create_novel()
+        novel.chapters = chapters
         return novel
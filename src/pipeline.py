@@ -0,0 +1,43 @@
+import asyncio
+from collections.abc import AsyncIterator
+from typing import TypeVar
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+async def prefetch(source: AsyncIterator[T], depth: int) -> AsyncIterator[T]:
+    """
+    Consome `source` em uma tarefa separada, mantendo até `depth` itens prontos.
+    Enquanto o consumidor (builder) processa um capítulo, o próximo já está sendo
+    baixado; a fila limitada segura o scraper se o builder ficar para trás.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, depth))
+
+    async def producer():
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(_DONE)
+
+    task = asyncio.create_task(producer())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Se o consumidor parar antes (erro, Ctrl+C), não deixa o scraper órfão
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
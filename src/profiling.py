@@ -0,0 +1,264 @@
+import asyncio
+import cProfile
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# Estágios do pipeline, na ordem em que aparecem no relatório
+STAGES = [
+    "index_discovery",
+    "chapter_fetch",
+    "cleaning",
+    "image_download",
+    "epub_assembly",
+    "email",
+]
+_TOP_ALLOCATIONS = 15
+
+
+@dataclass
+class StageStats:
+    profile: cProfile.Profile = field(default_factory=cProfile.Profile)
+    calls: int = 0
+    wall_time: float = 0.0
+    peak_bytes: int = 0
+    # Pico medido com outro estágio aberto em paralelo (o valor inclui o dele)
+    shared_peak: bool = False
+    # Dados da chamada com maior pico de memória
+    top_allocations: list[str] = field(default_factory=list)
+    worker_stats: list[str] = field(default_factory=list)
+    # Perfis de trabalho feito em threads (asyncio.to_thread)
+    thread_profiles: list[cProfile.Profile] = field(default_factory=list)
+
+
+@dataclass
+class _Frame:
+    name: str
+    started: float
+    base_bytes: int
+    task: asyncio.Task | None
+    # Só estágios de nível mais alto tiram snapshot (caro em execuções longas)
+    snapshot: tracemalloc.Snapshot | None
+    peak_bytes: int = 0
+    shared: bool = False
+
+
+class StageProfiler:
+    """
+    cProfile + tracemalloc separados por estágio do pipeline.
+    Só um cProfile pode ficar ativo por vez, então estágios aninhados pausam o
+    estágio de fora. Em código async, o que outras corrotinas executam durante
+    um `await` entra na conta do estágio ativo, a menos que abram o próprio estágio.
+    O tracemalloc só tem um pico global: com estágios de tarefas diferentes abertos
+    ao mesmo tempo (produtor e builder no modo streaming), o pico vale para todos
+    e sai marcado como compartilhado no relatório.
+    """
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.stats: dict[str, StageStats] = {}
+        self.stack: list[_Frame] = []
+
+    def start(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        tracemalloc.start()
+        return self
+
+    def _fold_peak(self):
+        """Distribui o pico atual para todos os estágios abertos e zera o contador."""
+        peak = tracemalloc.get_traced_memory()[1]
+        # Estágios de tarefas diferentes se sobrepõem; os da mesma tarefa são aninhados
+        shared = len({id(frame.task) for frame in self.stack}) > 1
+        for frame in self.stack:
+            frame.peak_bytes = max(frame.peak_bytes, peak - frame.base_bytes)
+            frame.shared = frame.shared or shared
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name: str):
+        stats = self.stats.setdefault(name, StageStats())
+        self._fold_peak()
+        if self.stack:
+            self.stats[self.stack[-1].name].profile.disable()
+
+        frame = _Frame(
+            name=name,
+            started=time.perf_counter(),
+            base_bytes=tracemalloc.get_traced_memory()[0],
+            task=_current_task(),
+            snapshot=None if self.stack else tracemalloc.take_snapshot(),
+        )
+        self.stack.append(frame)
+        stats.profile.enable()
+        try:
+            yield
+        finally:
+            self._fold_peak()
+            # Corrotinas podem sair fora de ordem: remove este frame onde estiver
+            active = self.stack[-1] is frame
+            if active:
+                stats.profile.disable()
+            self.stack.remove(frame)
+            if active and self.stack:
+                self.stats[self.stack[-1].name].profile.enable()
+
+            stats.calls += 1
+            stats.wall_time += time.perf_counter() - frame.started
+            if frame.peak_bytes >= stats.peak_bytes:
+                stats.peak_bytes = frame.peak_bytes
+                stats.shared_peak = frame.shared
+                if frame.snapshot:
+                    diff = tracemalloc.take_snapshot().compare_to(frame.snapshot, "lineno")
+                    stats.top_allocations = [str(d) for d in diff[:_TOP_ALLOCATIONS]]
+
+    def add_worker_result(self, name: str, peak_bytes: int, stats_path: str):
+        """Soma o resultado de uma chamada perfilada dentro de um processo do pool."""
+        stats = self.stats.setdefault(name, StageStats())
+        stats.calls += 1
+        stats.peak_bytes = max(stats.peak_bytes, peak_bytes)
+        stats.worker_stats.append(stats_path)
+
+    def add_thread_profile(self, name: str, profile: cProfile.Profile):
+        """Soma o perfil de uma chamada feita numa thread (a chamada já conta no estágio)."""
+        self.stats.setdefault(name, StageStats()).thread_profiles.append(profile)
+
+    def report(self):
+        """Grava .pstats e relatório de alocações por estágio, e um resumo geral."""
+        if self.stack:
+            self.stats[self.stack[-1].name].profile.disable()
+        tracemalloc.stop()
+
+        order = sorted(self.stats, key=lambda n: STAGES.index(n) if n in STAGES else len(STAGES))
+        heaviest = max(self.stats, key=lambda n: self.stats[n].peak_bytes, default=None)
+        lines = [f"{'estágio':<18}{'chamadas':>10}{'tempo (s)':>12}{'pico (MB)':>12}"]
+
+        for name in order:
+            stats = self.stats[name]
+            pst = _load_stats(stats)
+            if pst:
+                pst.dump_stats(str(self.output_dir / f"{name}.pstats"))
+
+            with open(self.output_dir / f"{name}_alloc.txt", "w", encoding="utf-8") as f:
+                f.write(f"Pico de memória: {stats.peak_bytes / 2**20:.2f} MB\n")
+                if stats.shared_peak:
+                    f.write("Pico compartilhado: medido com outro estágio aberto em paralelo.\n")
+                f.write(f"Chamadas: {stats.calls}\n\n")
+                if stats.top_allocations:
+                    f.write("Maiores alocações (chamada com maior pico):\n")
+                    f.write("\n".join(stats.top_allocations) + "\n\n")
+                if stats.worker_stats:
+                    f.write("Executado em processos do pool; pico medido em cada processo.\n\n")
+                if pst:
+                    f.write("Funções mais caras (tempo acumulado):\n")
+                    pst.stream = f
+                    pst.sort_stats("cumulative").print_stats(25)
+
+            flag = " *" if stats.shared_peak else ""
+            flag += "  <-- maior pico" if name == heaviest else ""
+            lines.append(
+                f"{name:<18}{stats.calls:>10}{stats.wall_time:>12.2f}"
+                f"{stats.peak_bytes / 2**20:>12.2f}{flag}"
+            )
+
+        if any(s.shared_peak for s in self.stats.values()):
+            lines.append("* pico compartilhado com estágio em paralelo (não é só deste estágio)")
+        summary = "\n".join(lines)
+        (self.output_dir / "summary.txt").write_text(summary + "\n", encoding="utf-8")
+        print("[Profile] Resumo por estágio:")
+        print(summary)
+        print(f"[Profile] Relatórios em: {self.output_dir}")
+
+
+def _load_stats(stats: StageStats) -> pstats.Stats | None:
+    """Junta o perfil local com os dos workers; None se nada foi medido."""
+    sources = [stats.profile] + stats.thread_profiles + stats.worker_stats
+    pst = None
+    for source in sources:
+        try:
+            if pst is None:
+                pst = pstats.Stats(source)
+            else:
+                pst.add(source)
+        except TypeError:
+            # Perfil que nunca rodou (estágio executado só no pool)
+            continue
+    return pst
+
+
+def _current_task() -> asyncio.Task | None:
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        # Fora de um event loop
+        return None
+
+
+# ── API GLOBAL ────────────────────────────────────────────────
+_active: StageProfiler | None = None
+
+
+def enable(output_dir: Path) -> StageProfiler:
+    global _active
+    _active = StageProfiler(output_dir).start()
+    return _active
+
+
+def stage(name: str):
+    """`with profiling.stage("cleaning"):` — não faz nada se o modo profile estiver desligado."""
+    return _active.stage(name) if _active else nullcontext()
+
+
+def _profiled_worker_call(name: str, output_dir: str, fn, *args):
+    """Roda `fn` dentro do processo do pool com cProfile + tracemalloc."""
+    profile = cProfile.Profile()
+    tracemalloc.start()
+    profile.enable()
+    try:
+        result = fn(*args)
+    finally:
+        profile.disable()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    stats_path = Path(output_dir) / "workers" / f"{name}.{os.getpid()}.{time.time_ns()}.prof"
+    stats_path.parent.mkdir(parents=True, exist_ok=True)
+    profile.dump_stats(str(stats_path))
+    return result, peak, str(stats_path)
+
+
+async def run_in_stage(process_stage, name: str, fn, *args):
+    """Executa `fn` no ProcessStage, perfilando dentro do worker se o modo profile estiver ligado."""
+    if not _active:
+        return await process_stage.run(fn, *args)
+    result, peak, stats_path = await process_stage.run(
+        _profiled_worker_call, name, str(_active.output_dir), fn, *args
+    )
+    _active.add_worker_result(name, peak, stats_path)
+    return result
+
+
+def _profiled_thread_call(fn, *args):
+    """Roda `fn` na thread com um cProfile próprio (o do event loop não enxerga threads)."""
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Python 3.12+: só um profiler ativo por vez no processo
+        return fn(*args), None
+    try:
+        return fn(*args), profile
+    finally:
+        profile.disable()
+
+
+async def run_in_thread(name: str, fn, *args):
+    """`asyncio.to_thread`, perfilando dentro da thread se o modo profile estiver ligado."""
+    if not _active:
+        return await asyncio.to_thread(fn, *args)
+    result, profile = await asyncio.to_thread(_profiled_thread_call, fn, *args)
+    if profile:
+        _active.add_thread_profile(name, profile)
+    return result
@@ -0,0 +1,71 @@
+import json
+import os
+import socket
+from pathlib import Path
+from urllib.parse import urlparse
+import httpx
+from playwright.async_api import Browser, BrowserContext
+from src import settings
+
+
+def _state_path(url: str) -> Path:
+    """Arquivo de sessão (cookies + localStorage) de um domínio."""
+    domain = urlparse(url).netloc.lower().removeprefix("www.") or "default"
+    return settings.SESSION_DIR / f"{domain}.json"
+
+
+async def new_session_context(browser: Browser, url: str, **kwargs) -> BrowserContext:
+    """
+    Cria o contexto do navegador restaurando a sessão salva do domínio, se houver.
+    Assim o cookie de liberação do Cloudflare sobrevive entre execuções.
+    """
+    path = _state_path(url)
+    if settings.SESSION_PERSIST and path.exists():
+        try:
+            context = await browser.new_context(storage_state=str(path), **kwargs)
+            print(f"[Sessão] Restaurada de {path.name}")
+            return context
+        except Exception as e:
+            # Arquivo corrompido ou de versão antiga: começa do zero
+            print(f"[Sessão] Ignorando sessão inválida ({e})")
+    return await browser.new_context(**kwargs)
+
+
+async def save_session(context: BrowserContext, url: str):
+    """Grava cookies e localStorage do contexto para a próxima execução."""
+    if not settings.SESSION_PERSIST:
+        return
+    path = _state_path(url)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    state = await context.storage_state()
+    # Escrita atômica: uma execução interrompida não deixa JSON pela metade.
+    # Nome por processo: workers de shard saem juntos e gravam o mesmo domínio
+    tmp = path.with_suffix(f".{socket.gethostname()}_{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    tmp.replace(path)
+
+
+async def cookies_to_client(context: BrowserContext, client: httpx.AsyncClient):
+    """Copia os cookies do navegador para o httpx (evita 403 nas imagens)."""
+    for c in await context.cookies():
+        client.cookies.set(c["name"], c["value"], domain=c["domain"], path=c["path"])
+
+
+async def cookies_to_context(client: httpx.AsyncClient, context: BrowserContext):
+    """Copia de volta os cookies recebidos pelo httpx para o navegador."""
+    cookies = []
+    for c in client.cookies.jar:
+        if not c.domain:
+            continue
+        cookie = {
+            "name": c.name,
+            "value": c.value or "",
+            "domain": c.domain,
+            "path": c.path or "/",
+            "secure": bool(c.secure),
+        }
+        if c.expires:
+            cookie["expires"] = float(c.expires)
+        cookies.append(cookie)
+    if cookies:
+        await context.add_cookies(cookies)
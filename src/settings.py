@@ -10,6 +10,19 @@ INDEX_URL = "https://illusia.com.br/story/sobrevivendo-no-jogo-como-um-barbaro/"
 COVER_MODE = "local" # "local" ou "auto"
 # Caminho da imagem se modo="local" (use r"" para evitar erros no Windows)
 COVER_FILE_PATH = r"./novels_output/Jujutsu Kaisen/jujutsu-kaisen.jpeg"
+# Onde procurar a capa na página da obra (modo="auto"), na ordem
+COVER_SELECTORS = [
+    ".book-cover img",
+    ".novel-cover img",
+    ".summary_image img",
+    ".manga-cover img",
+    ".thumb img",
+    "meta[property='og:image']",
+]
+# Variante que vai no EPUB (largura, altura) e miniatura guardada no cache
+COVER_DEVICE_SIZE = (1236, 1648)
+COVER_THUMB_SIZE = (300, 400)
+COVER_JPEG_QUALITY = 90
 
 # ── SELETORES CSS ─────────────────────────────────────────────
 CHAPTER_LINKS_SELECTOR = (
@@ -18,6 +31,26 @@ CHAPTER_LINKS_SELECTOR = (
     ".chapter-item a, .chapters-list a, .listing-chapters_wrap a"
 )
 
+# ── DESCOBERTA DO ÍNDICE ──────────────────────────────────────
+# "auto", "single", "pagination", "scroll" ou "api"
+INDEX_STRATEGY = "auto"
+# Links para as outras páginas da lista de capítulos
+INDEX_PAGINATION_SELECTOR = (
+    ".pagination a, a.page-numbers, .nav-links a, a[rel='next'], a[href*='/page/']"
+)
+# Botão "carregar mais" (deixe vazio se o site não tiver)
+INDEX_LOAD_MORE_SELECTOR = (
+    "button.load-more, .load-more, .chapter-readmore, button:has-text('Carregar mais')"
+)
+# Regex da URL da API JSON com a lista de capítulos (ex: r"/api/.*chapters")
+INDEX_API_URL_PATTERN = None
+INDEX_SCROLL_MAX_ROUNDS = 30
+INDEX_SCROLL_PAUSE = 1.5
+# Páginas do índice buscadas ao mesmo tempo
+INDEX_CONCURRENCY = 4
+# Limite de páginas do índice (HTML ou API) geradas a partir da paginação
+INDEX_MAX_PAGES = 200
+
 CONTENT_SELECTORS = [
     ".reading-content",
     ".chapter-content",
@@ -28,6 +61,9 @@ CONTENT_SELECTORS = [
     ".post-content",
 ]
 
+# Reduz o HTML dos capítulos a p/em/strong/br/img/h1-h6 (EPUB e cache menores)
+MINIFY_HTML = True
+
 TITLE_SELECTORS = [
     ".chapter-title",
     "h1.entry-title",
@@ -42,6 +78,52 @@ OUTPUT_BASE_DIR = Path("./novels_output")
 REQUEST_DELAY_MIN = 2.0
 REQUEST_DELAY_MAX = 5.0
 
+# Processos para parse/limpeza do HTML. Os downloads são sequenciais e o parse
+# roda enquanto os próximos capítulos baixam: um processo costuma bastar
+PARSE_WORKERS = 1
+# Capítulos baixados esperando parse (profundidade do pipeline). Com a fila cheia,
+# o próximo download espera o parse mais antigo terminar
+PARSE_MAX_PENDING = 4
+
+# Sessão persistente do navegador (cookies/localStorage por domínio)
+SESSION_PERSIST = True
+SESSION_DIR = OUTPUT_BASE_DIR / ".sessions"
+# Capas processadas, por URL de origem
+COVER_CACHE_DIR = OUTPUT_BASE_DIR / ".covers"
+
+# Cota de disco do OUTPUT_BASE_DIR (None = sem limite). Acima dela, capítulos em
+# cache são apagados (LRU, os já entregues primeiro)
+CACHE_QUOTA_GB = 20
+CACHE_ENFORCE_EVERY_MB = 200  # novos downloads entre verificações da cota
+CACHE_ACTIVE_TTL = 6 * 3600  # proteção de obra "em andamento" sem atividade
+
+# Ciclo de vida do navegador (execuções longas)
+BROWSER_RECYCLE_PAGES = 150  # páginas até recriar o contexto (cookies são mantidos)
+BROWSER_RESTART_PAGES = 1000  # páginas até relançar o Chromium
+BROWSER_MAX_RSS_MB = 1500  # memória do Chromium que força o relançamento
+BROWSER_HEALTH_TIMEOUT = 30  # segundos esperando uma página nova antes de relançar
+BROWSER_MAX_CRASHES = 3  # quedas seguidas antes de desistir
+BROWSER_DRAIN_TIMEOUT = 90  # espera máxima pelas páginas abertas antes de reciclar/relançar
+
+# Streaming: monta o EPUB enquanto os capítulos são baixados (memória constante)
+STREAM_BUILD = False
+# Capítulos prontos aguardando o builder (profundidade do pipeline)
+STREAM_DEPTH = 4
+
+# Compressão do EPUB: nível do deflate (0-9) para XHTML/CSS/OPF
+EPUB_COMPRESS_LEVEL = 6
+# Threads comprimindo em paralelo (None = número de núcleos)
+EPUB_COMPRESS_WORKERS = None
+# Já comprimidos: gravados sem deflate (ganho quase nulo, muito CPU)
+EPUB_STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+
+# Shards (vários processos/máquinas no mesmo OUTPUT_BASE_DIR compartilhado)
+SHARD_UNIT_SIZE = 20  # capítulos por unidade de trabalho
+SHARD_LEASE_TTL = 300  # segundos sem renovar até a unidade ser retomada
+SHARD_CLAIM_SETTLE = 2.0  # espera para confirmar a posse ao retomar uma lease
+SHARD_POLL_INTERVAL = 15  # intervalo checando o progresso (coordenador e workers sem unidade livre)
+SHARD_MAX_ATTEMPTS = 3  # tentativas de uma unidade com capítulos falhando
+
 # RETRY (Resiliência)
 MAX_RETRIES = 3
 
@@ -65,4 +147,47 @@ MANGA_IMG_SELECTOR = "img[src^='blob:'], .viewer-container img, .reading-content
 MANGA_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
     "Referer": "https://mangalivre.to/",  # Muitas CDNs bloqueiam sem referer
-}
\ No newline at end of file
+}
+
+# ── FILTRO DE PÁGINAS (MANGÁ) ─────────────────────────────────
+# Descarta páginas em branco, separadores e imagens de rastreamento
+FILTER_PAGES = True
+# Menores que isso (px) são pixels de rastreamento ou banners
+PAGE_MIN_WIDTH = 100
+PAGE_MIN_HEIGHT = 100
+# Desvio padrão mínimo do tom (0-255): abaixo disso a página é lisa (branca/preta)
+PAGE_MIN_STDDEV = 4.0
+# Tom a partir do qual um pixel conta como branco
+PAGE_WHITE_LEVEL = 245
+# Fração de pixels brancos a partir da qual a página é um separador
+PAGE_MAX_WHITE_RATIO = 0.995
+
+# ── WEBTOON (TIRAS LONGAS) ────────────────────────────────────
+# Corta imagens muito altas em várias páginas no formato da tela
+SLICE_WEBTOON = True
+# Altura/largura mínima para considerar a imagem uma tira longa
+SLICE_MIN_RATIO = 3.0
+# Proporção altura/largura da tela do leitor (Kindle Paperwhite: 1648x1236)
+DEVICE_ASPECT_RATIO = 1648 / 1236
+# Quanto o corte pode se afastar da altura ideal procurando uma faixa lisa (fração da página)
+SLICE_SEARCH_WINDOW = 0.25
+# Variação máxima de tom (0-255) para uma linha contar como "calha" entre quadros
+SLICE_GUTTER_TOLERANCE = 12
+SLICE_JPEG_QUALITY = 90
+# Processos para fatiar (None = número de núcleos)
+SLICE_WORKERS = None
+
+# ── MODO WATCH (python main.py --watch) ───────────────────────
+# Séries acompanhadas pelo daemon. Ex:
+# WATCH_SERIES = [
+#     {"title": "Jujutsu Kaisen", "url": "https://mangalivre.to/manga/jujutsu-kaisen/", "is_manga": True},
+#     {"title": "Sobrevivendo no Jogo", "url": INDEX_URL, "interval": 3 * 3600},
+# ]
+WATCH_SERIES = []
+WATCH_DEFAULT_INTERVAL = 6 * 3600  # segundos entre checagens (ponto de partida)
+WATCH_MIN_INTERVAL = 30 * 60  # séries que atualizam muito não passam disso
+WATCH_MAX_INTERVAL = 24 * 3600  # séries paradas não passam disso
+WATCH_JITTER = 0.1  # variação aleatória do intervalo (fração)
+WATCH_STATUS_INTERVAL = 60  # frequência de atualização do watch_status.json
+# Checagens seguidas com envio falho antes de desistir do lote (marca como conhecido)
+WATCH_MAX_SEND_ATTEMPTS = 3
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import time
+from pathlib import Path
+from src.models import ChapterRef
+from src import settings
+
+
+class ShardCoordinator:
+    """
+    Divide os capítulos de uma obra em unidades de trabalho dentro do cache
+    compartilhado (ex: OUTPUT_BASE_DIR em NFS):
+
+        <obra>/shards/plan.json        lista de capítulos e tamanho das unidades
+        <obra>/shards/unit_0003.lease  dono atual da unidade e validade da lease
+        <obra>/shards/unit_0003.done   unidade concluída
+        <obra>/shards/unit_0003.failed capítulos que falharam e tentativas da unidade
+
+    A criação de arquivos com O_EXCL/link é atômica também em NFS, então só um
+    worker consegue cada unidade. Leases vencidas (worker que caiu) são
+    retomadas por outro. A validade usa o relógio de cada máquina: mantenha os
+    relógios sincronizados (NTP) e SHARD_LEASE_TTL bem maior que a diferença.
+    """
+
+    def __init__(self, title_dir: Path, worker_id: str | None = None):
+        self.dir = title_dir / "shards"
+        self.plan_path = self.dir / "plan.json"
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+    # ── PLANO ─────────────────────────────────────────────────
+    def load_plan(self) -> dict | None:
+        if not self.plan_path.exists():
+            return None
+        return json.loads(self.plan_path.read_text(encoding="utf-8"))
+
+    def create_plan(self, refs: list[ChapterRef]) -> dict:
+        """Grava o plano; se outro worker já gravou, usa o dele."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        plan = {
+            "unit_size": settings.SHARD_UNIT_SIZE,
+            "chapters": [{"url": r.url, "number": r.number} for r in refs],
+        }
+        tmp = self.dir / f"plan.{self.worker_id.replace(':', '_')}.tmp"
+        tmp.write_text(json.dumps(plan, ensure_ascii=False), encoding="utf-8")
+        try:
+            # link() falha se o destino existir: o primeiro plano vence
+            os.link(tmp, self.plan_path)
+        except FileExistsError:
+            plan = self.load_plan()
+        finally:
+            tmp.unlink(missing_ok=True)
+        return plan
+
+    @staticmethod
+    def unit_count(plan: dict) -> int:
+        return math.ceil(len(plan["chapters"]) / plan["unit_size"])
+
+    @staticmethod
+    def unit_chapters(plan: dict, unit: int) -> list[tuple[int, str]]:
+        """(índice do capítulo, URL) de uma unidade, com índice começando em 1."""
+        size = plan["unit_size"]
+        first = unit * size
+        chapters = plan["chapters"][first : first + size]
+        return [(first + i + 1, c["url"]) for i, c in enumerate(chapters)]
+
+    # ── LEASES ────────────────────────────────────────────────
+    def _lease_path(self, unit: int) -> Path:
+        return self.dir / f"unit_{unit:04d}.lease"
+
+    def _done_path(self, unit: int) -> Path:
+        return self.dir / f"unit_{unit:04d}.done"
+
+    def _failed_path(self, unit: int) -> Path:
+        return self.dir / f"unit_{unit:04d}.failed"
+
+    def _lease_data(self) -> bytes:
+        lease = {"worker": self.worker_id, "expires": time.time() + settings.SHARD_LEASE_TTL}
+        return json.dumps(lease).encode("utf-8")
+
+    def _read_lease(self, unit: int) -> dict | None:
+        try:
+            return json.loads(self._lease_path(unit).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def _write_lease(self, unit: int):
+        path = self._lease_path(unit)
+        tmp = path.with_name(f"{path.name}.{self.worker_id.replace(':', '_')}.tmp")
+        tmp.write_bytes(self._lease_data())
+        tmp.replace(path)
+
+    async def try_claim(self, unit: int) -> bool:
+        if self._done_path(unit).exists():
+            return False
+        try:
+            fd = os.open(self._lease_path(unit), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            lease = self._read_lease(unit)
+            # Lease ilegível pode ser uma escrita em andamento: não mexe
+            if not lease or lease["expires"] > time.time():
+                return False
+            print(f"[Shard] Unidade {unit} abandonada por {lease['worker']}, retomando.")
+            self._write_lease(unit)
+            # Dois workers podem retomar ao mesmo tempo: o último a gravar vence.
+            # Espera as escritas assentarem e confere quem ficou com a lease.
+            await asyncio.sleep(settings.SHARD_CLAIM_SETTLE + random.random())
+            lease = self._read_lease(unit)
+            return bool(lease) and lease["worker"] == self.worker_id
+        with os.fdopen(fd, "wb") as f:
+            f.write(self._lease_data())
+        return True
+
+    async def claim_next(self, plan: dict) -> int | None:
+        for unit in range(self.unit_count(plan)):
+            if await self.try_claim(unit):
+                return unit
+        return None
+
+    def renew(self, unit: int) -> bool:
+        """Estende a lease; False se outro worker a tomou (lease venceu)."""
+        lease = self._read_lease(unit)
+        if not lease or lease["worker"] != self.worker_id:
+            return False
+        self._write_lease(unit)
+        return True
+
+    def complete(self, unit: int):
+        self._done_path(unit).write_text(self.worker_id, encoding="utf-8")
+        self._lease_path(unit).unlink(missing_ok=True)
+
+    def release(self, unit: int):
+        lease = self._read_lease(unit)
+        if lease and lease["worker"] == self.worker_id:
+            self._lease_path(unit).unlink(missing_ok=True)
+
+    # ── FALHAS ────────────────────────────────────────────────
+    def record_failure(self, unit: int, urls: list[str]) -> int:
+        """Registra os capítulos que falharam; retorna quantas tentativas a unidade já teve."""
+        path = self._failed_path(unit)
+        try:
+            attempts = json.loads(path.read_text(encoding="utf-8"))["attempts"]
+        except (OSError, ValueError, KeyError):
+            attempts = 0
+        data = {"attempts": attempts + 1, "urls": urls}
+        path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        return attempts + 1
+
+    def clear_failure(self, unit: int):
+        self._failed_path(unit).unlink(missing_ok=True)
+
+    def failed_urls(self, plan: dict) -> list[str]:
+        """Capítulos que continuaram falhando depois de SHARD_MAX_ATTEMPTS tentativas."""
+        urls = []
+        for unit in range(self.unit_count(plan)):
+            if not self._done_path(unit).exists():
+                continue
+            try:
+                urls.extend(json.loads(self._failed_path(unit).read_text(encoding="utf-8"))["urls"])
+            except (OSError, ValueError, KeyError):
+                continue
+        return urls
+
+    def progress(self, plan: dict) -> tuple[int, int]:
+        total = self.unit_count(plan)
+        done = sum(1 for u in range(total) if self._done_path(u).exists())
+        return done, total
+
+    def clear(self):
+        """Remove o plano e as leases (depois que o EPUB foi montado)."""
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+async def _keep_lease(coordinator: ShardCoordinator, unit: int, lost: asyncio.Event):
+    while True:
+        await asyncio.sleep(settings.SHARD_LEASE_TTL / 3)
+        if not coordinator.renew(unit):
+            print(f"[Shard] Lease da unidade {unit} perdida.")
+            lost.set()
+            return
+
+
+async def run_shard_worker(scraper, coordinator: ShardCoordinator) -> int:
+    """
+    Pega unidades livres e baixa seus capítulos para o cache até todas estarem
+    concluídas (esperando as leases de workers que caíram vencerem).
+    `scraper` é um NovelScraper ou MangaScraper já aberto (navegador próprio).
+    Retorna quantas unidades este worker concluiu.
+    """
+    plan = coordinator.load_plan()
+    if not plan:
+        refs = await scraper.discover_chapters()
+        if not refs:
+            print("[Shard] Nenhum capítulo encontrado.")
+            return 0
+        plan = coordinator.create_plan(refs)
+
+    finished = 0
+    while True:
+        unit = await coordinator.claim_next(plan)
+        if unit is None:
+            done, total = coordinator.progress(plan)
+            # Plano removido: o coordenador já montou o livro
+            if done == total or not coordinator.plan_path.exists():
+                break
+            # O resto está com outros workers. Se um deles caiu, a lease vence
+            # (SHARD_LEASE_TTL) e a unidade é retomada por quem ainda está de pé
+            print(
+                f"[Shard] {total - done} unidades com outros workers "
+                f"({done}/{total}). Aguardando leases..."
+            )
+            await asyncio.sleep(settings.SHARD_POLL_INTERVAL)
+            continue
+
+        chapters = coordinator.unit_chapters(plan, unit)
+        print(
+            f"[Shard] {coordinator.worker_id} pegou a unidade {unit} "
+            f"(caps {chapters[0][0]}-{chapters[-1][0]})"
+        )
+        lost = asyncio.Event()
+        keeper = asyncio.create_task(_keep_lease(coordinator, unit, lost))
+        failed: list[str] = []
+        try:
+            for index, url in chapters:
+                # Lease perdida: outro worker já está refazendo esta unidade
+                if lost.is_set():
+                    break
+                if scraper.load_cached_chapter(url, index):
+                    continue
+                # fetch_chapter já tem retry; como no modo normal, falha definitiva
+                # só deixa o capítulo de fora do livro
+                if not await scraper.fetch_chapter(url, index):
+                    failed.append(url)
+                await asyncio.sleep(
+                    random.uniform(settings.REQUEST_DELAY_MIN, settings.REQUEST_DELAY_MAX)
+                )
+        except BaseException:
+            # Ctrl+C ou erro inesperado: devolve a unidade na hora
+            coordinator.release(unit)
+            raise
+        finally:
+            keeper.cancel()
+
+        if lost.is_set():
+            continue
+        if failed:
+            attempts = coordinator.record_failure(unit, failed)
+            if attempts < settings.SHARD_MAX_ATTEMPTS:
+                # Devolve a unidade: a próxima tentativa só baixa o que falhou
+                print(
+                    f"[Shard] Unidade {unit}: {len(failed)} capítulos falharam "
+                    f"(tentativa {attempts}/{settings.SHARD_MAX_ATTEMPTS}), devolvendo."
+                )
+                coordinator.release(unit)
+                continue
+            print(
+                f"[Shard] Unidade {unit}: {len(failed)} capítulos falharam em "
+                f"{attempts} tentativas; ficam de fora do livro."
+            )
+        else:
+            coordinator.clear_failure(unit)
+        coordinator.complete(unit)
+        finished += 1
+
+    print(f"[Shard] Todas as unidades concluídas ({finished} por este worker).")
+    return finished
+
+
+async def wait_for_shards(coordinator: ShardCoordinator) -> dict:
+    """Espera o plano existir e todas as unidades terminarem."""
+    while True:
+        plan = coordinator.load_plan()
+        if plan:
+            done, total = coordinator.progress(plan)
+            if done == total:
+                return plan
+            print(f"[Coordenador] {done}/{total} unidades concluídas...")
+        else:
+            print("[Coordenador] Aguardando o primeiro worker montar o plano...")
+        await asyncio.sleep(settings.SHARD_POLL_INTERVAL)
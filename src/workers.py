@@ -0,0 +1,38 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+class ProcessStage:
+    """
+    Estágio de trabalho pesado de CPU (parse e limpeza do HTML) fora do event loop.
+    Limita quantas tarefas podem ficar pendentes no pool: é um teto de segurança
+    para chamadas concorrentes. No fluxo normal quem segura os downloads é o
+    `iter_chapters`, que nunca deixa mais de PARSE_MAX_PENDING parses na fila.
+    """
+
+    def __init__(self, max_workers: int | None = None, max_pending: int | None = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self.executor: ProcessPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._slots = asyncio.Semaphore(self.max_pending)
+        return self
+
+    async def run(self, fn, *args):
+        """Executa `fn(*args)` em um processo do pool e aguarda o resultado."""
+        self.start()
+        # Se o pool estiver cheio, quem chama espera aqui (backpressure)
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, fn, *args)
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+            self._slots = None